@@ -1,14 +1,22 @@
 # asgi.py
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RangerAi.settings')
+
+# Initialise Django avant d'importer les consumers (qui importent les modèles)
+django_asgi_app = get_asgi_application()
+
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-from routing import websocket_urlpatterns
+from requette.eco_points import start_flusher
+from requette.routing import websocket_urlpatterns
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RangerAi.settings')
+# Processus serveur : le journal des points est appliqué en arrière-plan
+start_flusher()
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
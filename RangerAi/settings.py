@@ -10,6 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import atexit
+import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +61,8 @@ CHANNEL_LAYERS = {
 }
 
 MIDDLEWARE = [
+    'requette.metrics.PerformanceMetricsMiddleware',
+    'requette.routers.ReadOnlyRequestMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +74,33 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'RangerAi.urls'
 
+REST_FRAMEWORK = {
+    # Renderers par défaut de DRF, chronométrés pour /metrics
+    'DEFAULT_RENDERER_CLASSES': [
+        'requette.metrics.TimedJSONRenderer',
+        'requette.metrics.TimedBrowsableAPIRenderer',
+    ],
+}
+
+# Dossier des fichiers partagés entre workers (RANGERAI_CATALOG_CACHE_DIR pour le déplacer).
+# Sous `manage.py test`, un dossier temporaire : les tests ne lisent ni n'écrasent
+# jamais les fichiers du développeur.
+CATALOG_CACHE_DIR = Path(os.environ.get('RANGERAI_CATALOG_CACHE_DIR', BASE_DIR))
+if sys.argv[1:2] == ['test']:
+    CATALOG_CACHE_DIR = Path(tempfile.mkdtemp(prefix='rangerai-tests-'))
+    atexit.register(shutil.rmtree, CATALOG_CACHE_DIR, ignore_errors=True)
+
+# Snapshot binaire du catalogue mappé en mémoire par les workers (manage.py build_catalog_snapshot)
+CATALOG_SNAPSHOT_PATH = CATALOG_CACHE_DIR / 'catalog.snapshot'
+
+# Mode write-behind des points écologiques : les complétions sont journalisées
+# et appliquées aux profils par lots toutes les ECO_POINTS_FLUSH_INTERVAL secondes
+ECO_POINTS_WRITE_BEHIND = False
+ECO_POINTS_FLUSH_INTERVAL = 2.0
+
+# Journalise (avec le SQL) les requêtes plus lentes que ce seuil ; None pour désactiver
+METRICS_SLOW_REQUEST_MS = None
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -96,6 +130,53 @@ DATABASES = {
     }
 }
 
+# Profil de production (RANGERAI_DB_PROFILE=production) : WAL pour que les écritures
+# ne bloquent plus les lectures, connexions persistantes, et un alias 'replica'
+# en lecture seule sur le même fichier pour le trafic GET (voir requette.routers).
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA mmap_size=268435456;'
+    'PRAGMA cache_size=-65536;'
+    'PRAGMA temp_store=MEMORY;'
+)
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': SQLITE_PRAGMAS,
+}
+
+SQLITE_REPLICA_OPTIONS = {
+    'timeout': 20,
+    'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+}
+
+if os.environ.get('RANGERAI_DB_PROFILE') == 'production':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': SQLITE_REPLICA_OPTIONS,
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['requette.routers.ReadReplicaRouter']
+
+# Sous `manage.py test`, l'alias 'replica' existe toujours (miroir de 'default') :
+# les tests du routage l'activent avec override_settings(DATABASE_ROUTERS=...).
+if sys.argv[1:2] == ['test'] and 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -17,7 +17,8 @@ from django.contrib import admin
 from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
-from requette import views
+from requette import views, async_views
+from requette.metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r'sites', views.TouristicSiteViewSet)
@@ -28,5 +29,13 @@ router.register(r'profiles', views.UserProfileViewSet)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
+    # Endpoints de lecture servis nativement en asynchrone (ASGI)
+    path('api/async/sites/', async_views.site_list, name='async-site-list'),
+    path('api/async/sites/eco_friendly/', async_views.site_eco_friendly, name='async-site-eco-friendly'),
+    path('api/async/sites/<str:pk>/', async_views.site_detail, name='async-site-detail'),
+    path('api/async/sites/<str:pk>/nearby_services/', async_views.site_nearby_services,
+         name='async-site-nearby-services'),
+    path('api/async/services/by_type/', async_views.service_by_type, name='async-service-by-type'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
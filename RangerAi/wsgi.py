@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RangerAi.settings')
 
 application = get_wsgi_application()
+
+# Processus serveur : le journal des points est appliqué en arrière-plan
+from requette.eco_points import start_flusher  # noqa: E402
+
+start_flusher()
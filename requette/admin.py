@@ -7,3 +7,4 @@ admin.site.register(UserProfile)
 admin.site.register(Service)
 admin.site.register(UserAction)
 admin.site.register(EcoAction)
+admin.site.register(EcoPointsJournal)
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class RequetteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'requette'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .eco_points import start_flusher_on_request
+        from .metrics import install_query_timer
+        from .snapshot import catalog_snapshot
+
+        connection_created.connect(install_query_timer)
+        request_started.connect(start_flusher_on_request, dispatch_uid='requette.start_flusher')
+        catalog_snapshot.open()
@@ -0,0 +1,117 @@
+# async_views.py
+"""
+Vues asynchrones en lecture seule pour les endpoints les plus sollicités.
+Elles utilisent l'ORM asynchrone et renvoient exactement le même JSON que
+les actions équivalentes des ViewSets, sans passer par le pool de threads.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import filters
+from rest_framework.request import Request
+
+from .metrics import TimedJSONRenderer
+from .models import TouristicSite, Service
+from .search import FullTextSearchFilter
+from .serializer import TouristicSiteSerializer, ServiceSerializer
+from .snapshot import catalog_snapshot
+from .views import TouristicSiteViewSet
+
+_renderer = TimedJSONRenderer()
+
+
+def _json(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+async def _get_site(pk):
+    """
+    Retourne (site, None) ou (None, réponse 404) avec le même message que
+    get_object_or_404 + exception_handler de DRF.
+    """
+    try:
+        return await TouristicSite.objects.aget(pk=pk), None
+    except TouristicSite.DoesNotExist:
+        return None, _json({'detail': 'No TouristicSite matches the given query.'}, status=404)
+    except (ValueError, TypeError):
+        return None, _json({'detail': 'Not found.'}, status=404)
+
+
+@require_safe
+async def site_list(request):
+    """
+    Équivalent asynchrone de GET /api/sites/ (avec ?search= et ?ordering=).
+    """
+    drf_request = Request(request)
+    view = TouristicSiteViewSet
+    queryset = TouristicSite.objects.all()
+    if FullTextSearchFilter().get_search_terms(drf_request):
+        # La recherche plein texte interroge l'index de façon synchrone
+        queryset = await sync_to_async(FullTextSearchFilter().filter_queryset)(drf_request, queryset, view)
+    queryset = filters.OrderingFilter().filter_queryset(drf_request, queryset, view)
+    sites = [site async for site in queryset]
+    return _json(TouristicSiteSerializer(sites, many=True, context={'request': drf_request}).data)
+
+
+@require_safe
+async def site_detail(request, pk):
+    """
+    Équivalent asynchrone de GET /api/sites/{id}/.
+    """
+    site, error = await _get_site(pk)
+    if error is not None:
+        return error
+    return _json(TouristicSiteSerializer(site, context={'request': Request(request)}).data)
+
+
+@require_safe
+async def site_nearby_services(request, pk):
+    """
+    Équivalent asynchrone de GET /api/sites/{id}/nearby_services/.
+    """
+    site, error = await _get_site(pk)
+    if error is not None:
+        return error
+    radius = float(request.GET.get('radius', 5.0))
+
+    nearby = catalog_snapshot.nearby_services(site.latitude, site.longitude, radius)
+    if nearby is not None:
+        found = {
+            service.id: service
+            async for service in Service.objects.filter(pk__in=[service_id for service_id, _ in nearby])
+        }
+        services = [found[service_id] for service_id, _ in nearby if service_id in found]
+    else:
+        services = [service async for service in Service.objects.raw('''
+            SELECT *,
+                   6371 * acos(cos(radians(%s)) * cos(radians(latitude)) *
+                   cos(radians(longitude) - radians(%s)) +
+                   sin(radians(%s)) * sin(radians(latitude))) AS distance
+            FROM requette_service
+            GROUP BY distance
+            HAVING distance < %s
+            ORDER BY distance
+        ''', [site.latitude, site.longitude, site.latitude, radius])]
+    return _json(ServiceSerializer(services, many=True).data)
+
+
+@require_safe
+async def site_eco_friendly(request):
+    """
+    Équivalent asynchrone de GET /api/sites/eco_friendly/.
+    """
+    sites = [site async for site in TouristicSite.objects.filter(eco_score__gte=4)]
+    return _json(TouristicSiteSerializer(sites, many=True).data)
+
+
+@require_safe
+async def service_by_type(request):
+    """
+    Équivalent asynchrone de GET /api/services/by_type/.
+    """
+    services_by_type = [
+        row async for row in
+        Service.objects.values('type').annotate(count=Count('id')).order_by('type')
+    ]
+    return _json(services_by_type)
@@ -0,0 +1,270 @@
+# benchmarks.py
+import math
+import platform
+import random
+import time
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from .consumers import TourismConsumer
+from .metrics import Sample, collect
+from .models import TouristicSite, Service, EcoAction, UserProfile, UserAction
+from .search import tokenize
+
+# Le consumer n'utilise pas de groupes : une couche en mémoire évite de dépendre de Redis
+BENCHMARK_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# Cas qui écrivent : une action ne peut être complétée qu'une fois par jour
+WRITE_CASES = ('POST /api/profiles/{id}/complete_action/', 'ws complete_action')
+
+
+def percentile(sorted_values, p):
+    """
+    Percentile par rang le plus proche sur une liste déjà triée.
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p * len(sorted_values) / 100) - 1))
+    return sorted_values[rank]
+
+
+def summarize(durations, query_counts, errors, elapsed):
+    durations = sorted(durations)
+    count = len(durations)
+    return {
+        'count': count,
+        'errors': errors,
+        'p50_ms': round(percentile(durations, 50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(durations, 95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(durations, 99) * 1000, 3) if count else None,
+        'mean_ms': round(sum(durations) / count * 1000, 3) if count else None,
+        'throughput_rps': round(count / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(sum(query_counts) / count, 2) if count else None,
+    }
+
+
+class BenchmarkRunner:
+    """
+    Mesure les endpoints REST (via le client de test Django) et les actions
+    de TourismConsumer (via WebsocketCommunicator) sur la base configurée.
+    """
+
+    def __init__(self, iterations=100, warmup=5, include_writes=False, seed=0):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.include_writes = include_writes
+        self.rng = random.Random(seed)
+        self.site_ids = list(TouristicSite.objects.values_list('id', flat=True)[:5000])
+        self.service_ids = list(Service.objects.values_list('id', flat=True)[:5000])
+        self.action_ids = list(EcoAction.objects.values_list('id', flat=True))
+        self.profile = UserProfile.objects.select_related('user').order_by('-eco_points').first()
+        words = ' '.join(TouristicSite.objects.values_list('name', flat=True)[:200])
+        self.search_terms = sorted(set(t for t in tokenize(words) if len(t) > 3)) or ['site']
+
+    def _site(self):
+        return self.rng.choice(self.site_ids)
+
+    def _prefix(self):
+        term = self.rng.choice(self.search_terms)
+        return term[:max(3, len(term) - 2)]
+
+    def http_cases(self):
+        """
+        Retourne les cas HTTP : nom -> fonction (client) -> réponse.
+        """
+        cases = {}
+        if self.site_ids:
+            cases.update({
+                'GET /api/sites/': lambda c: c.get('/api/sites/'),
+                'GET /api/sites/{id}/': lambda c: c.get(f'/api/sites/{self._site()}/'),
+                'GET /api/sites/{id}/nearby_services/': lambda c: c.get(
+                    f'/api/sites/{self._site()}/nearby_services/', {'radius': 5}),
+                'GET /api/sites/eco_friendly/': lambda c: c.get('/api/sites/eco_friendly/'),
+                'GET /api/sites/?search=': lambda c: c.get('/api/sites/', {'search': self._prefix()}),
+                'GET /api/async/sites/': lambda c: c.get('/api/async/sites/'),
+                'GET /api/async/sites/{id}/': lambda c: c.get(f'/api/async/sites/{self._site()}/'),
+                'GET /api/async/sites/{id}/nearby_services/': lambda c: c.get(
+                    f'/api/async/sites/{self._site()}/nearby_services/', {'radius': 5}),
+            })
+        if len(self.site_ids) >= 10:
+            cases['GET /api/sites/itinerary/'] = lambda c: c.get('/api/sites/itinerary/', {
+                'ids': ','.join(map(str, self.rng.sample(self.site_ids, 10)))})
+        if self.service_ids:
+            cases.update({
+                'GET /api/services/': lambda c: c.get('/api/services/'),
+                'GET /api/services/by_type/': lambda c: c.get('/api/services/by_type/'),
+                'GET /api/services/?search=': lambda c: c.get('/api/services/', {'search': self._prefix()}),
+            })
+        cases['GET /api/eco-actions/popular_actions/'] = lambda c: c.get('/api/eco-actions/popular_actions/')
+        if self.profile:
+            profile_id = self.profile.id
+            cases['GET /api/profiles/{id}/statistics/'] = lambda c: c.get(
+                f'/api/profiles/{profile_id}/statistics/')
+            if self.include_writes and self.action_ids:
+                cases['POST /api/profiles/{id}/complete_action/'] = lambda c: c.post(
+                    f'/api/profiles/{profile_id}/complete_action/',
+                    {'action_id': self.rng.choice(self.action_ids)}, content_type='application/json')
+        return cases
+
+    def ws_cases(self):
+        """
+        Retourne les messages WebSocket : nom -> fonction () -> message.
+        """
+        cases = {}
+        if self.site_ids:
+            coordinates = list(
+                TouristicSite.objects.filter(id__in=self.site_ids[:500]).values_list('latitude', 'longitude')
+            )
+
+            def get_services():
+                latitude, longitude = self.rng.choice(coordinates)
+                return {'action': 'get_services', 'latitude': latitude, 'longitude': longitude, 'radius': 5}
+
+            cases['ws get_services'] = get_services
+            cases['ws get_site_details'] = lambda: {'action': 'get_site_details', 'site_id': self._site()}
+        if self.include_writes and self.profile and self.action_ids:
+            cases['ws complete_action'] = lambda: {
+                'action': 'complete_action', 'action_id': self.rng.choice(self.action_ids)}
+        return cases
+
+    def _forget_completions(self):
+        """
+        Oublie les actions complétées aujourd'hui par le profil mesuré, hors chronométrage,
+        pour que chaque complete_action soit accepté.
+        """
+        UserAction.objects.filter(
+            user_profile=self.profile, completed_at__date=timezone.now().date()
+        ).delete()
+
+    def _prepare(self, name):
+        return self._forget_completions if name in WRITE_CASES else None
+
+    def _measure(self, name, call, is_error):
+        prepare = self._prepare(name)
+        for _ in range(self.warmup):
+            if prepare:
+                prepare()
+            call()
+        durations, query_counts, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(self.iterations):
+            if prepare:
+                prepare()
+            with collect(Sample('bench', name)) as sample:
+                start = time.perf_counter()
+                result = call()
+                durations.append(time.perf_counter() - start)
+            query_counts.append(sample.query_count)
+            errors += bool(is_error(result))
+        return summarize(durations, query_counts, errors, time.perf_counter() - started)
+
+    def run_http(self):
+        client = Client(raise_request_exception=False)
+        if self.profile:
+            client.force_login(self.profile.user)
+        return {
+            name: self._measure(name, lambda case=case: case(client), lambda r: r.status_code >= 400)
+            for name, case in self.http_cases().items()
+        }
+
+    async def _run_ws(self, cases):
+        user = self.profile.user if self.profile else AnonymousUser()
+        # Le consumer tourne dans sa propre tâche, avec un contexte vide :
+        # on y rattache un échantillon partagé, remis à zéro à chaque message.
+        sample = Sample('bench', 'ws')
+        consumer = TourismConsumer.as_asgi()
+
+        async def application(scope, receive, send):
+            with collect(sample):
+                return await consumer(scope, receive, send)
+
+        communicator = WebsocketCommunicator(application, '/ws/tourism/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError("Connexion WebSocket refusée")
+        await communicator.receive_json_from()  # message de bienvenue
+
+        results = {}
+        for name, message in cases.items():
+            prepare = self._prepare(name)
+            prepare = sync_to_async(prepare) if prepare else None
+
+            async def call(message=message):
+                await communicator.send_json_to(message())
+                return await communicator.receive_json_from(timeout=30)
+
+            for _ in range(self.warmup):
+                if prepare:
+                    await prepare()
+                await call()
+            durations, query_counts, errors = [], [], 0
+            started = time.perf_counter()
+            for _ in range(self.iterations):
+                if prepare:
+                    await prepare()
+                sample.query_count = 0
+                start = time.perf_counter()
+                reply = await call()
+                durations.append(time.perf_counter() - start)
+                query_counts.append(sample.query_count)
+                errors += reply.get('type') == 'error' or (reply.get('data') or {}).get('status') == 'error'
+            results[name] = summarize(durations, query_counts, errors, time.perf_counter() - started)
+        await communicator.disconnect()
+        return results
+
+    def run_ws(self):
+        cases = self.ws_cases()
+        if not cases:
+            return {}
+        with override_settings(CHANNEL_LAYERS=BENCHMARK_CHANNEL_LAYERS):
+            return async_to_sync(self._run_ws)(cases)
+
+    def run(self):
+        results = self.run_http()
+        results.update(self.run_ws())
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'iterations': self.iterations,
+                'warmup': self.warmup,
+                'include_writes': self.include_writes,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'dataset': {
+                    'sites': TouristicSite.objects.count(),
+                    'services': Service.objects.count(),
+                    'profiles': UserProfile.objects.count(),
+                    'user_actions': UserAction.objects.count(),
+                },
+            },
+            'results': results,
+        }
+
+
+def failed_cases(report):
+    """
+    Retourne {cas: nombre d'erreurs} pour les cas dont au moins une requête a échoué.
+    """
+    return {name: result['errors'] for name, result in report['results'].items() if result['errors']}
+
+
+def compare(report, baseline):
+    """
+    Compare deux rapports : variation relative du p50 et du p95 par endpoint.
+    """
+    rows = {}
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        rows[name] = {
+            key: round((result[key] - previous[key]) / previous[key] * 100, 1)
+            if result.get(key) is not None and previous.get(key) else None
+            for key in ('p50_ms', 'p95_ms')
+        }
+    return rows
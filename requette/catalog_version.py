@@ -0,0 +1,84 @@
+# catalog_version.py
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+class ModelVersion:
+    """
+    Jeton de version d'un modèle du catalogue, partagé entre processus.
+
+    Les caches en mémoire (matrice des distances, index inversé) ne suivent que
+    les signaux de leur propre processus. Après une écriture en masse (bulk_create,
+    import), `bump()` remplace un petit fichier dans CATALOG_CACHE_DIR ; chaque cache
+    compare son contenu à celui lu au chargement, au plus une fois par seconde
+    comme CatalogSnapshot, et se recharge s'il a changé.
+    """
+
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._token = None
+        self._checked_at = 0.0
+
+    @property
+    def path(self):
+        return os.path.join(str(settings.CATALOG_CACHE_DIR), f'{self.model._meta.db_table}.version')
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def current(self, refresh=False):
+        """
+        Retourne le jeton actuel (None si le modèle n'a jamais été modifié en masse).
+        """
+        now = time.monotonic()
+        if refresh or now - self._checked_at >= self.CHECK_INTERVAL:
+            with self._lock:
+                self._token = self._read()
+                self._checked_at = now
+        return self._token
+
+    def bump(self):
+        """
+        Signale à tous les processus que le modèle a changé sans passer par les signaux.
+        """
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.version-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return self.current(refresh=True)
+
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def model_version(model):
+    with _versions_lock:
+        version = _versions.get(model)
+        if version is None:
+            version = _versions[model] = ModelVersion(model)
+        return version
+
+
+def bump_catalog_version(*models):
+    for model in models:
+        model_version(model).bump()
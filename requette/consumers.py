@@ -5,6 +5,11 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from .models import TouristicSite, Service, UserProfile, EcoAction, UserAction
+from .images import derivative_urls
+from .metrics import track, track_serialization
+from .snapshot import catalog_snapshot
+from .eco_points import write_behind_enabled, journal_points, effective_points
+from django.db import transaction
 from django.db.models import F
 import math
 
@@ -14,6 +19,18 @@ class TourismConsumer(AsyncWebsocketConsumer):
     Gère la recherche de services, la validation d'actions écologiques et les mises à jour des profils utilisateurs.
     """
 
+    # Actions reconnues ; les autres sont comptées sous 'unknown' dans /metrics
+    # pour qu'un client ne puisse pas créer de nouvelles séries à volonté
+    ACTIONS = ('get_services', 'complete_action', 'get_site_details')
+
+    @classmethod
+    def encode_json(cls, content):
+        """
+        Sérialise un message sortant en JSON (chronométré pour /metrics).
+        """
+        with track_serialization():
+            return json.dumps(content)
+
     async def connect(self):
         """
         Gère la connexion d'un client au WebSocket.
@@ -32,7 +49,7 @@ class TourismConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Envoie un message de bienvenue
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=self.encode_json({
             'type': 'welcome',
             'message': 'Connecté au service de tourisme écologique',
             'user_id': self.user_id
@@ -58,16 +75,23 @@ class TourismConsumer(AsyncWebsocketConsumer):
         Returns:
             list: Liste des services trouvés avec leurs informations et distances
         """
-        # Utilise la formule de Haversine pour calculer les distances
-        services = Service.objects.raw('''
-            SELECT *, 
-                   6371 * acos(cos(radians(%s)) * cos(radians(latitude)) *
-                   cos(radians(longitude) - radians(%s)) + 
-                   sin(radians(%s)) * sin(radians(latitude))) AS distance
-            FROM tourism_service
-            HAVING distance < %s
-            ORDER BY distance
-        ''', [latitude, longitude, latitude, radius])
+        nearby = catalog_snapshot.nearby_services(float(latitude), float(longitude), float(radius))
+        if nearby is not None:
+            # Snapshot mappé en mémoire : seuls les services trouvés sont lus en base
+            found = Service.objects.in_bulk([service_id for service_id, _ in nearby])
+            services = [(found[service_id], distance) for service_id, distance in nearby if service_id in found]
+        else:
+            # Utilise la formule de Haversine pour calculer les distances
+            services = [(service, service.distance) for service in Service.objects.raw('''
+                SELECT *, 
+                       6371 * acos(cos(radians(%s)) * cos(radians(latitude)) *
+                       cos(radians(longitude) - radians(%s)) + 
+                       sin(radians(%s)) * sin(radians(latitude))) AS distance
+                FROM requette_service
+                GROUP BY distance
+                HAVING distance < %s
+                ORDER BY distance
+            ''', [latitude, longitude, latitude, radius])]
         
         # Formate les résultats pour le retour
         return [{
@@ -75,11 +99,11 @@ class TourismConsumer(AsyncWebsocketConsumer):
             'name': service.name,
             'type': service.type,
             'description': service.description,
-            'distance': round(service.distance, 2),
+            'distance': round(distance, 2),
             'eco_friendly': service.eco_friendly,
             'latitude': float(service.latitude),
             'longitude': float(service.longitude)
-        } for service in services]
+        } for service, distance in services]
 
     @database_sync_to_async
     def get_site_details(self, site_id):
@@ -102,7 +126,8 @@ class TourismConsumer(AsyncWebsocketConsumer):
                 'eco_score': site.eco_score,
                 'latitude': float(site.latitude),
                 'longitude': float(site.longitude),
-                'image_url': site.image.url if site.image else None
+                'image_url': site.image.url if site.image else None,
+                'image_derivatives': derivative_urls(site)
             }
         except TouristicSite.DoesNotExist:
             return None
@@ -131,6 +156,24 @@ class TourismConsumer(AsyncWebsocketConsumer):
                 action=action,
                 completed_at__date=timezone.now().date()
             ).exists():
+                if write_behind_enabled():
+                    # Journalise les points : le profil sera mis à jour par lots
+                    with transaction.atomic():
+                        UserAction.objects.create(
+                            user_profile=user_profile,
+                            action=action
+                        )
+                        journal_points(user_profile, action.points)
+                    points, level = effective_points(user_profile)
+                    return {
+                        'status': 'success',
+                        'points': points,
+                        'level': level,
+                        'level_up': level > user_profile.level,
+                        'points_earned': action.points,
+                        'action_name': action.name
+                    }
+
                 # Ajoute les points
                 user_profile.eco_points = F('eco_points') + action.points
                 user_profile.save()
@@ -171,7 +214,6 @@ class TourismConsumer(AsyncWebsocketConsumer):
                 'message': 'Action non trouvée'
             }
 
-    @database_sync_to_async
     def check_level_up(self, user_profile):
         """
         Vérifie et met à jour le niveau de l'utilisateur.
@@ -200,67 +242,69 @@ class TourismConsumer(AsyncWebsocketConsumer):
         Args:
             text_data (str): Données JSON reçues du client
         """
-        try:
-            data = json.loads(text_data)
-            action = data.get('action')
+        with track('ws') as sample:
+            try:
+                data = json.loads(text_data)
+                action = data.get('action')
+                sample.endpoint = action if action in self.ACTIONS else 'unknown'
 
-            # Gestion des différentes actions
-            if action == 'get_services':
-                # Récupération des services à proximité
-                latitude = data.get('latitude')
-                longitude = data.get('longitude')
-                radius = data.get('radius', 5)
+                # Gestion des différentes actions
+                if action == 'get_services':
+                    # Récupération des services à proximité
+                    latitude = data.get('latitude')
+                    longitude = data.get('longitude')
+                    radius = data.get('radius', 5)
                 
-                if latitude is not None and longitude is not None:
-                    services = await self.get_nearby_services(latitude, longitude, radius)
-                    await self.send(text_data=json.dumps({
-                        'type': 'services_list',
-                        'services': services
-                    }))
-                else:
-                    await self.send(text_data=json.dumps({
-                        'type': 'error',
-                        'message': 'Latitude et longitude requises'
-                    }))
+                    if latitude is not None and longitude is not None:
+                        services = await self.get_nearby_services(latitude, longitude, radius)
+                        await self.send(text_data=self.encode_json({
+                            'type': 'services_list',
+                            'services': services
+                        }))
+                    else:
+                        await self.send(text_data=self.encode_json({
+                            'type': 'error',
+                            'message': 'Latitude et longitude requises'
+                        }))
 
-            elif action == 'complete_action':
-                # Validation d'une action écologique
-                if self.user_id:
-                    action_id = data.get('action_id')
-                    result = await self.complete_eco_action(self.user_id, action_id)
-                    await self.send(text_data=json.dumps({
-                        'type': 'action_result',
-                        'data': result
-                    }))
-                else:
-                    await self.send(text_data=json.dumps({
-                        'type': 'error',
-                        'message': 'Utilisateur non authentifié'
-                    }))
+                elif action == 'complete_action':
+                    # Validation d'une action écologique
+                    if self.user_id:
+                        action_id = data.get('action_id')
+                        result = await self.complete_eco_action(self.user_id, action_id)
+                        await self.send(text_data=self.encode_json({
+                            'type': 'action_result',
+                            'data': result
+                        }))
+                    else:
+                        await self.send(text_data=self.encode_json({
+                            'type': 'error',
+                            'message': 'Utilisateur non authentifié'
+                        }))
 
-            elif action == 'get_site_details':
-                # Récupération des détails d'un site
-                site_id = data.get('site_id')
-                site_details = await self.get_site_details(site_id)
+                elif action == 'get_site_details':
+                    # Récupération des détails d'un site
+                    site_id = data.get('site_id')
+                    site_details = await self.get_site_details(site_id)
                 
-                if site_details:
-                    await self.send(text_data=json.dumps({
-                        'type': 'site_details',
-                        'data': site_details
-                    }))
-                else:
-                    await self.send(text_data=json.dumps({
-                        'type': 'error',
-                        'message': 'Site non trouvé'
-                    }))
+                    if site_details:
+                        await self.send(text_data=self.encode_json({
+                            'type': 'site_details',
+                            'data': site_details
+                        }))
+                    else:
+                        await self.send(text_data=self.encode_json({
+                            'type': 'error',
+                            'message': 'Site non trouvé'
+                        }))
 
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Format de données invalide'
-            }))
-        except Exception as e:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': f'Erreur: {str(e)}'
-            }))
\ No newline at end of file
+            except json.JSONDecodeError:
+                await self.send(text_data=self.encode_json({
+                    'type': 'error',
+                    'message': 'Format de données invalide'
+                }))
+            except Exception as e:
+                await self.send(text_data=self.encode_json({
+                    'type': 'error',
+                    'message': f'Erreur: {str(e)}'
+                }))
\ No newline at end of file
@@ -0,0 +1,177 @@
+# eco_points.py
+import logging
+import math
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import UserProfile, EcoPointsJournal
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 1000
+
+_flusher = None
+_flusher_lock = threading.Lock()
+# Distingue « pas d'annotation » d'une annotation valant 0
+_NOT_ANNOTATED = object()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'ECO_POINTS_WRITE_BEHIND', False)
+
+
+def with_pending_points(queryset):
+    """
+    Annote `pending_eco_points` (0 sans entrée dans le journal) pour éviter
+    une requête par profil. Ne fait rien si le write-behind est désactivé.
+    """
+    if not write_behind_enabled():
+        return queryset
+    return queryset.annotate(pending_eco_points=Coalesce(Sum('ecopointsjournal__points'), 0))
+
+
+def level_for_points(points):
+    """
+    Formule de niveau : niveau = sqrt(points/100)
+    """
+    return int(math.sqrt(max(points, 0) / 100))
+
+
+def pending_points(profile):
+    """
+    Points journalisés pour ce profil mais pas encore appliqués.
+    Utilise l'annotation `pending_eco_points` si le queryset l'a fournie.
+    """
+    pending = getattr(profile, 'pending_eco_points', _NOT_ANNOTATED)
+    if pending is _NOT_ANNOTATED:
+        pending = (
+            EcoPointsJournal.objects
+            .filter(user_profile=profile)
+            .aggregate(total=Sum('points'))['total']
+        )
+    return pending or 0
+
+
+def effective_points(profile):
+    """
+    Retourne (points, niveau) en incluant les points en attente.
+    Sans write-behind, le profil est à jour : aucune requête supplémentaire.
+    """
+    if not write_behind_enabled():
+        return profile.eco_points, profile.level
+    points = profile.eco_points + pending_points(profile)
+    return points, max(profile.level, level_for_points(points))
+
+
+def journal_points(profile, points):
+    """
+    Enregistre des points dans le journal au lieu de réécrire le profil.
+    Doit être appelé dans la même transaction que la création du UserAction.
+    Le flusher en arrière-plan appliquera les sommes par lots.
+    """
+    EcoPointsJournal.objects.create(user_profile=profile, points=points)
+    if hasattr(profile, 'pending_eco_points'):
+        profile.pending_eco_points += points
+    transaction.on_commit(ensure_flusher)
+
+
+def flush_pending_points(batch_size=FLUSH_BATCH_SIZE):
+    """
+    Applique un lot d'entrées du journal : une mise à jour par profil,
+    montée de niveau comprise, puis suppression des entrées, dans une seule transaction.
+
+    Returns:
+        int: nombre d'entrées appliquées
+    """
+    with transaction.atomic():
+        entries = list(
+            EcoPointsJournal.objects
+            .select_for_update(skip_locked=True)
+            .order_by('id')
+            .values_list('id', 'user_profile_id', 'points')[:batch_size]
+        )
+        if not entries:
+            return 0
+
+        totals = defaultdict(int)
+        for _, profile_id, points in entries:
+            totals[profile_id] += points
+        for profile_id, points in totals.items():
+            UserProfile.objects.filter(pk=profile_id).update(eco_points=F('eco_points') + points)
+
+        leveled_up = []
+        for profile in UserProfile.objects.filter(pk__in=totals).only('id', 'eco_points', 'level'):
+            new_level = level_for_points(profile.eco_points)
+            if new_level > profile.level:
+                profile.level = new_level
+                leveled_up.append(profile)
+        UserProfile.objects.bulk_update(leveled_up, ['level'])
+
+        EcoPointsJournal.objects.filter(pk__in=[entry_id for entry_id, _, _ in entries]).delete()
+        return len(entries)
+
+
+def flush_all_pending_points(batch_size=FLUSH_BATCH_SIZE):
+    total = 0
+    while True:
+        applied = flush_pending_points(batch_size)
+        total += applied
+        if applied < batch_size:
+            return total
+
+
+class EcoPointsFlusher(threading.Thread):
+    """
+    Thread du processus qui vide régulièrement le journal des points.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='eco-points-flusher', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                flush_all_pending_points()
+            except Exception:
+                # Réessayé au prochain passage : les entrées restent dans le journal
+                logger.exception("Échec de l'application du journal des points")
+            finally:
+                connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def ensure_flusher():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = EcoPointsFlusher(getattr(settings, 'ECO_POINTS_FLUSH_INTERVAL', 2.0))
+            _flusher.start()
+    return _flusher
+
+
+def start_flusher():
+    """
+    À appeler au démarrage d'un processus serveur (asgi.py, wsgi.py) : applique aussi
+    les entrées restées dans le journal avant un redémarrage. Les commandes (migrate,
+    shell...) ne démarrent pas de thread.
+    """
+    if write_behind_enabled():
+        ensure_flusher()
+
+
+def start_flusher_on_request(sender, **kwargs):
+    """
+    Reçu sur request_started : démarre le flusher au premier appel d'un serveur
+    lancé sans asgi.py/wsgi.py (runserver).
+    """
+    if _flusher is None:
+        start_flusher()
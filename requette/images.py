@@ -0,0 +1,165 @@
+# images.py
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Tailles maximales (largeur, hauteur) des dérivés générés pour chaque image
+DERIVATIVE_SIZES = {
+    'thumbnail': (320, 320),
+    'medium': (1024, 1024),
+}
+# Format -> (extension, paramètres d'encodage Pillow)
+DERIVATIVE_FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVES_DIR = 'derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(image_name, size, fmt):
+    """
+    Chemin de stockage d'un dérivé, ex: sites/2.png -> sites/derivatives/2.png_thumbnail.webp
+    Le nom complet (extension comprise) est conservé : sites/2.jpg a ses propres dérivés.
+    """
+    directory, filename = os.path.split(image_name)
+    extension = DERIVATIVE_FORMATS[fmt][0]
+    return os.path.join(directory, DERIVATIVES_DIR, f'{filename}_{size}.{extension}')
+
+
+def derivative_urls(site):
+    """
+    Retourne les URLs des dérivés de l'image d'un site, groupées par taille puis par format.
+    Les URLs sont déduites du nom du fichier (aucun accès au stockage).
+
+    Returns:
+        dict: {'thumbnail': {'webp': url, 'jpeg': url}, 'medium': {...}}, ou None tant que
+        les dérivés de l'image actuelle n'ont pas été générés (le client utilise alors l'image d'origine)
+    """
+    image = site.image
+    if not image or site.derivatives_image != image.name:
+        return None
+    return {
+        size: {
+            fmt: default_storage.url(derivative_name(image.name, size, fmt))
+            for fmt in DERIVATIVE_FORMATS
+        }
+        for size in DERIVATIVE_SIZES
+    }
+
+
+def mark_derivatives_ready(image_name):
+    """
+    Signale que les dérivés de `image_name` existent : derivative_urls les expose désormais.
+    """
+    from .models import TouristicSite
+
+    TouristicSite.objects.filter(image=image_name).update(derivatives_image=image_name)
+
+
+def has_derivatives(image_name):
+    return all(
+        default_storage.exists(derivative_name(image_name, size, fmt))
+        for size in DERIVATIVE_SIZES
+        for fmt in DERIVATIVE_FORMATS
+    )
+
+
+def render_derivatives(data):
+    """
+    Redimensionne et encode une image dans toutes les tailles et tous les formats.
+    Exécutée dans un processus du pool : ne touche ni à la base ni au stockage.
+
+    Args:
+        data (bytes): contenu de l'image originale
+
+    Returns:
+        dict: {(taille, format): bytes}
+    """
+    from PIL import Image, ImageOps
+
+    results = {}
+    with Image.open(BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = original.mode in ('RGBA', 'LA') or 'transparency' in original.info
+        for size, bounds in DERIVATIVE_SIZES.items():
+            resized = original.copy()
+            resized.thumbnail(bounds, Image.LANCZOS)
+            for fmt, (_, options) in DERIVATIVE_FORMATS.items():
+                if fmt == 'webp' and has_alpha:
+                    image = resized.convert('RGBA')
+                else:
+                    image = resized.convert('RGB')
+                buffer = BytesIO()
+                image.save(buffer, **options)
+                results[size, fmt] = buffer.getvalue()
+    return results
+
+
+def save_derivatives(image_name, rendered):
+    for (size, fmt), content in rendered.items():
+        name = derivative_name(image_name, size, fmt)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+    mark_derivatives_ready(image_name)
+
+
+def process_context():
+    """
+    Contexte multiprocessing des pools de rendu : le serveur est multi-thread, un fork
+    pourrait copier un verrou tenu par un autre thread. forkserver (ou spawn, hors POSIX)
+    démarre les processus depuis un interpréteur propre.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def get_executor():
+    """
+    Pool de processus partagé pour la génération des dérivés (créé au premier usage).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                mp_context=process_context(),
+            )
+        return _executor
+
+
+def schedule_derivatives(image):
+    """
+    Lance en arrière-plan la génération des dérivés d'une image.
+    L'encodage se fait dans le pool de processus, l'écriture dans le stockage
+    se fait au retour, dans le processus Django.
+    """
+    image_name = image.name
+    with image.open('rb') as source:
+        data = source.read()
+
+    def on_done(future):
+        try:
+            save_derivatives(image_name, future.result())
+        except Exception:
+            logger.exception("Échec de la génération des dérivés pour %s", image_name)
+        finally:
+            # Rappel exécuté dans un thread du pool : on ferme sa connexion à la base
+            connections.close_all()
+
+    future = get_executor().submit(render_derivatives, data)
+    future.add_done_callback(on_done)
+    return future
@@ -0,0 +1,270 @@
+# itinerary.py
+import logging
+import math
+import threading
+from array import array
+
+from django.db import connections
+
+from .catalog_version import model_version
+from .models import TouristicSite
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class SiteDistanceMatrix:
+    """
+    Matrice des distances (km) entre tous les sites touristiques, gardée en mémoire.
+
+    La matrice est construite en arrière-plan (jamais pendant une requête) puis
+    maintenue de façon incrémentale : l'ajout, la modification ou la suppression
+    d'un site ne recalcule que la ligne et la colonne concernées. Elle est
+    reconstruite quand un autre processus signale une écriture en masse (voir
+    catalog_version). Chaque ligne est un array('d') contigu pour limiter
+    l'empreinte mémoire.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._warming = False
+        self._index = {}      # site_id -> position dans la matrice
+        self._ids = []        # position -> site_id
+        self._lat = array('d')
+        self._lon = array('d')
+        self._cos_lat = array('d')
+        self._rows = []
+        self._version = None
+
+    def _distances_from(self, position):
+        """
+        Calcule en une passe les distances de Haversine entre le site à
+        `position` et tous les autres sites de la matrice.
+        """
+        lat1 = self._lat[position]
+        lon1 = self._lon[position]
+        cos1 = self._cos_lat[position]
+        sin = math.sin
+        return array('d', (
+            2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0,
+                sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * sin((lon2 - lon1) / 2) ** 2
+            )))
+            for lat2, lon2, cos2 in zip(self._lat, self._lon, self._cos_lat)
+        ))
+
+    def _append(self, site_id, latitude, longitude):
+        lat = math.radians(latitude)
+        self._index[site_id] = len(self._ids)
+        self._ids.append(site_id)
+        self._lat.append(lat)
+        self._lon.append(math.radians(longitude))
+        self._cos_lat.append(math.cos(lat))
+
+    def load(self):
+        """
+        (Re)construit la matrice complète à partir de la base de données.
+        Le calcul (O(N²)) se fait hors du verrou : les lectures continuent sur l'ancienne matrice.
+        """
+        # Lu avant les données : une écriture pendant le chargement provoquera un rechargement
+        version = model_version(TouristicSite).current(refresh=True)
+        fresh = SiteDistanceMatrix()
+        for site_id, latitude, longitude in TouristicSite.objects.values_list('id', 'latitude', 'longitude'):
+            fresh._append(site_id, latitude, longitude)
+        fresh._rows = [fresh._distances_from(i) for i in range(len(fresh._ids))]
+        with self._lock:
+            self._index, self._ids, self._rows = fresh._index, fresh._ids, fresh._rows
+            self._lat, self._lon, self._cos_lat = fresh._lat, fresh._lon, fresh._cos_lat
+            self._version = version
+            self._loaded = True
+
+    def warm(self):
+        """
+        Lance la construction de la matrice dans un thread, si elle n'est pas déjà en cours.
+        """
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Échec de la construction de la matrice des distances")
+            finally:
+                self._warming = False
+                connections.close_all()
+
+        threading.Thread(target=run, name='site-distances-warmup', daemon=True).start()
+
+    def invalidate(self):
+        """
+        Oublie la matrice ; elle sera reconstruite au prochain accès.
+        """
+        with self._lock:
+            self._loaded = False
+
+    def upsert(self, site_id, latitude, longitude):
+        """
+        Ajoute ou met à jour un site sans reconstruire toute la matrice.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            position = self._index.get(site_id)
+            if position is None:
+                self._append(site_id, latitude, longitude)
+                position = len(self._ids) - 1
+                self._rows.append(array('d'))
+                for row in self._rows[:-1]:
+                    row.append(0.0)
+            else:
+                lat = math.radians(latitude)
+                self._lat[position] = lat
+                self._lon[position] = math.radians(longitude)
+                self._cos_lat[position] = math.cos(lat)
+
+            row = self._distances_from(position)
+            self._rows[position] = row
+            for other, distance in enumerate(row):
+                self._rows[other][position] = distance
+
+    def remove(self, site_id):
+        """
+        Retire un site de la matrice (la dernière ligne prend sa place).
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            position = self._index.pop(site_id, None)
+            if position is None:
+                return
+            last = len(self._ids) - 1
+            if position != last:
+                moved_id = self._ids[last]
+                self._ids[position] = moved_id
+                self._index[moved_id] = position
+                self._lat[position] = self._lat[last]
+                self._lon[position] = self._lon[last]
+                self._cos_lat[position] = self._cos_lat[last]
+                self._rows[position] = self._rows[last]
+                for row in self._rows:
+                    row[position] = row[last]
+            self._ids.pop()
+            self._lat.pop()
+            self._lon.pop()
+            self._cos_lat.pop()
+            self._rows.pop()
+            for row in self._rows:
+                row.pop()
+
+    def submatrix(self, sites):
+        """
+        Retourne la sous-matrice des distances entre les sites demandés, dans leur ordre.
+
+        Args:
+            sites (list): [(site_id, latitude, longitude)] lus en base pour cette requête.
+                Les sites absents de la matrice ou déplacés depuis (par un autre processus)
+                y sont mis à jour. Tant que la matrice n'est pas prête, les distances
+                sont calculées directement (k² au lieu de N²) et la matrice est construite
+                en arrière-plan.
+        """
+        with self._lock:
+            if self._loaded and model_version(TouristicSite).current() != self._version:
+                self._loaded = False
+            if not self._loaded:
+                self.warm()
+                return direct_distances(sites)
+            for site_id, latitude, longitude in sites:
+                position = self._index.get(site_id)
+                if (position is None or self._lat[position] != math.radians(latitude)
+                        or self._lon[position] != math.radians(longitude)):
+                    self.upsert(site_id, latitude, longitude)
+            positions = [self._index[site_id] for site_id, _, _ in sites]
+            return [[self._rows[i][j] for j in positions] for i in positions]
+
+
+def direct_distances(sites):
+    """
+    Calcule la matrice des distances entre quelques sites, sans cache.
+    """
+    matrix = SiteDistanceMatrix()
+    for site_id, latitude, longitude in sites:
+        matrix._append(site_id, latitude, longitude)
+    return [list(matrix._distances_from(i)) for i in range(len(matrix._ids))]
+
+
+site_distances = SiteDistanceMatrix()
+
+
+def nearest_neighbour_order(matrix, start=0):
+    """
+    Construit un parcours initial en allant toujours au site non visité le plus proche.
+    """
+    n = len(matrix)
+    order = [start]
+    remaining = set(range(n)) - {start}
+    while remaining:
+        row = matrix[order[-1]]
+        nearest = min(remaining, key=row.__getitem__)
+        order.append(nearest)
+        remaining.remove(nearest)
+    return order
+
+
+def two_opt(order, matrix):
+    """
+    Améliore un parcours ouvert (départ fixé) en inversant des segments
+    tant que cela réduit la distance totale.
+    """
+    order = list(order)
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            a, b = order[i - 1], order[i]
+            for j in range(i + 1, n):
+                c = order[j]
+                delta = matrix[a][c] - matrix[a][b]
+                if j + 1 < n:
+                    d = order[j + 1]
+                    delta += matrix[b][d] - matrix[c][d]
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    b = order[i]
+                    improved = True
+    return order
+
+
+def plan_itinerary(site_ids):
+    """
+    Calcule un ordre de visite pour les sites donnés (le premier site est le départ).
+
+    Args:
+        site_ids (list): IDs des sites, le premier étant le point de départ
+
+    Returns:
+        dict: ordre de visite, distances de chaque étape et distance totale (km)
+
+    Raises:
+        KeyError: si un des sites n'existe pas
+    """
+    site_ids = list(dict.fromkeys(site_ids))
+    # Coordonnées lues en base : la matrice d'un worker peut ignorer une écriture d'un autre
+    coordinates = {
+        site_id: (latitude, longitude)
+        for site_id, latitude, longitude in TouristicSite.objects.filter(
+            pk__in=site_ids
+        ).values_list('id', 'latitude', 'longitude')
+    }
+    matrix = site_distances.submatrix([(site_id, *coordinates[site_id]) for site_id in site_ids])
+    order = two_opt(nearest_neighbour_order(matrix), matrix)
+    legs = [round(matrix[a][b], 3) for a, b in zip(order, order[1:])]
+    return {
+        'order': [site_ids[i] for i in order],
+        'legs': legs,
+        'total_distance': round(sum(matrix[a][b] for a, b in zip(order, order[1:])), 3),
+    }
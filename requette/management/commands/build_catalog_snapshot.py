@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from requette.snapshot import snapshot_path, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Écrit le snapshot binaire du catalogue (sites et services) mappé en mémoire par les workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help="Chemin du fichier (défaut: settings.CATALOG_SNAPSHOT_PATH)")
+
+    def handle(self, *args, **options):
+        path = options['path'] or snapshot_path()
+        site_count, service_count = write_snapshot(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot écrit dans {path}: {site_count} sites, {service_count} services"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from requette.eco_points import flush_all_pending_points
+
+
+class Command(BaseCommand):
+    help = "Applique aux profils les points écologiques en attente dans le journal (mode write-behind)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        applied = flush_all_pending_points(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{applied} entrée(s) du journal appliquée(s)"))
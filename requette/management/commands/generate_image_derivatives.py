@@ -0,0 +1,67 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from requette.images import (
+    has_derivatives, mark_derivatives_ready, process_context, render_derivatives, save_derivatives,
+)
+from requette.models import TouristicSite
+
+
+class Command(BaseCommand):
+    help = "Génère les miniatures (WebP/JPEG) des images des sites touristiques existants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Régénère aussi les dérivés déjà présents")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Nombre de processus (défaut: nombre de CPU)")
+
+    def handle(self, *args, **options):
+        image_names = (
+            TouristicSite.objects
+            .exclude(image='')
+            .order_by()
+            .values_list('image', flat=True)
+            .distinct()
+        )
+        todo = []
+        for name in image_names.iterator():
+            if options['force'] or not has_derivatives(name):
+                todo.append(name)
+            else:
+                # Dérivés déjà présents (ex. générés avant la migration 0005) : on les expose
+                mark_derivatives_ready(name)
+        self.stdout.write(f"{len(todo)} image(s) à traiter")
+
+        workers = options['workers']
+        max_pending = 2 * (workers or 4)
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as executor:
+            pending = {}
+            names = iter(todo)
+            while True:
+                # Garde un nombre borné d'images en mémoire
+                for name in names:
+                    if not default_storage.exists(name):
+                        self.stderr.write(f"Fichier introuvable: {name}")
+                        failed += 1
+                        continue
+                    with default_storage.open(name, 'rb') as source:
+                        pending[executor.submit(render_derivatives, source.read())] = name
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = pending.pop(future)
+                    try:
+                        save_derivatives(name, future.result())
+                        done += 1
+                    except Exception as e:
+                        self.stderr.write(f"Échec pour {name}: {e}")
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{done} image(s) traitée(s), {failed} échec(s)"))
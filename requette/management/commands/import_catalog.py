@@ -0,0 +1,281 @@
+import csv
+import json
+import os
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from requette.catalog_version import bump_catalog_version
+from requette.itinerary import site_distances
+from requette.models import TouristicSite, Service
+from requette.search import rebuild_search_indexes
+from requette.snapshot import snapshot_path, write_snapshot
+
+# Colonnes (CSV) ou propriétés (GeoJSON) reconnues ; `external_id` est obligatoire
+SITE_FIELDS = ('name', 'description', 'type', 'latitude', 'longitude', 'eco_score', 'image')
+SERVICE_FIELDS = ('name', 'type', 'description', 'eco_friendly', 'latitude', 'longitude')
+SITE_REFERENCE = 'site_external_id'
+
+TRUE_VALUES = {'1', 'true', 't', 'oui', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'non', 'no', 'n', ''}
+
+_FEATURES_RE = re.compile(r'"features"\s*:\s*\[')
+READ_SIZE = 1 << 16
+
+
+def read_csv(path):
+    """
+    Produit (numéro de ligne, dict) pour chaque ligne du fichier CSV.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if value != ''}
+
+
+def read_geojson(path):
+    """
+    Produit (numéro de feature, dict) pour chaque feature d'une FeatureCollection,
+    sans charger le fichier entier : seul le tableau `features` est décodé, élément par élément.
+    Les coordonnées d'une géométrie Point donnent la longitude et la latitude.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer, eof = '', False
+        while True:
+            match = _FEATURES_RE.search(buffer)
+            if match:
+                position = match.end()
+                break
+            if eof:
+                raise CommandError(f"{path}: tableau 'features' introuvable")
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buffer += chunk
+
+        number = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError('Fin du tampon', buffer, position)
+                feature, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Feature incomplète dans le tampon : on lit la suite du fichier
+                if eof:
+                    raise CommandError(f"{path}: GeoJSON invalide ou tronqué après la feature {number}")
+                chunk = f.read(READ_SIZE)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+
+            number += 1
+            yield number, _feature_row(feature)
+            if position > READ_SIZE:
+                buffer, position = buffer[position:], 0
+
+
+def _feature_row(feature):
+    if not isinstance(feature, dict):
+        return {}
+    row = {key: value for key, value in (feature.get('properties') or {}).items() if value is not None}
+    if 'external_id' not in row and feature.get('id') is not None:
+        row['external_id'] = feature['id']
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') == 'Point':
+        coordinates = geometry.get('coordinates') or []
+        if len(coordinates) >= 2:
+            row['longitude'], row['latitude'] = coordinates[0], coordinates[1]
+    return row
+
+
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv(path)
+    if extension in ('.geojson', '.json'):
+        return read_geojson(path)
+    raise CommandError(f"{path}: format non reconnu (attendu .csv, .geojson ou .json)")
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValidationError({'eco_friendly': f"Valeur booléenne invalide: {value!r}"})
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des sites et services depuis des fichiers CSV ou GeoJSON, en flux. "
+        "Les lignes sont validées puis insérées par lots ; une ligne dont l'external_id "
+        "existe déjà met à jour l'enregistrement existant."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', help="Fichier des sites (.csv, .geojson)")
+        parser.add_argument('--services', help="Fichier des services (.csv, .geojson), "
+                                                f"rattachés aux sites par la colonne {SITE_REFERENCE}")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Lignes par INSERT")
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="Lignes par transaction")
+        parser.add_argument('--skip-derivatives', action='store_true',
+                            help="Ne génère pas les miniatures des images importées")
+
+    def handle(self, *args, **options):
+        if not options['sites'] and not options['services']:
+            raise CommandError("Indiquez --sites et/ou --services")
+        self.batch_size = options['batch_size']
+        self.chunk_size = options['chunk_size']
+        # external_id -> pk des sites, complété au fil de l'import puis depuis la base au besoin
+        self.site_ids = {}
+        self.rejected = 0
+        self.with_images = False
+
+        imported_sites = imported_services = 0
+        if options['sites']:
+            imported_sites = self._import(options['sites'], self._build_site, self._save_sites)
+        if options['services']:
+            imported_services = self._import(options['services'], self._build_service, self._save_services)
+
+        if imported_sites or imported_services:
+            self._rebuild_derived(options['skip_derivatives'])
+
+        message = f"{imported_sites} site(s) et {imported_services} service(s) importé(s)"
+        if self.rejected:
+            self.stdout.write(self.style.WARNING(f"{message}, {self.rejected} ligne(s) rejetée(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def _import(self, path, build, save):
+        """
+        Lit le fichier en flux et enregistre les lignes valides par paquets de `chunk_size`.
+        Chaque paquet est validé dans sa propre transaction : en cas d'interruption,
+        relancer l'import reprend sans doublon grâce à l'upsert sur external_id.
+        """
+        imported = 0
+        chunk = {}
+        for number, row in read_rows(path):
+            try:
+                instance = build(row)
+            except ValidationError as e:
+                self._reject(path, number, e)
+                continue
+            # Un external_id répété dans le fichier : la dernière ligne l'emporte
+            chunk[instance.external_id] = (number, instance, set(row))
+            if len(chunk) >= self.chunk_size:
+                imported += save(path, list(chunk.values()))
+                chunk = {}
+        if chunk:
+            imported += save(path, list(chunk.values()))
+        return imported
+
+    def _reject(self, path, number, error):
+        self.rejected += 1
+        if hasattr(error, 'message_dict'):
+            details = '; '.join(
+                f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items()
+            )
+        else:
+            details = ' '.join(error.messages)
+        self.stderr.write(f"{os.path.basename(path)}:{number}: {details}")
+
+    def _validate(self, instance, row, exclude):
+        if not instance.external_id:
+            raise ValidationError({'external_id': "Ce champ est obligatoire."})
+        instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+
+    def _build_site(self, row):
+        site = TouristicSite(external_id=str(row.get('external_id', '')).strip(),
+                             **{field: row.get(field) for field in SITE_FIELDS if field != 'image'},
+                             image=row.get('image', ''))
+        self._validate(site, row, exclude=['image'])
+        return site
+
+    def _build_service(self, row):
+        service = Service(external_id=str(row.get('external_id', '')).strip(),
+                          **{field: row.get(field) for field in SERVICE_FIELDS if field != 'eco_friendly'},
+                          eco_friendly=parse_bool(row.get('eco_friendly', False)))
+        if not row.get(SITE_REFERENCE):
+            raise ValidationError({SITE_REFERENCE: "Ce champ est obligatoire."})
+        # Résolu au moment de l'enregistrement, à partir de la table external_id -> pk
+        service.site_external_id = str(row[SITE_REFERENCE]).strip()
+        self._validate(service, row, exclude=['site'])
+        return service
+
+    def _upsert(self, model, rows, fields, always=()):
+        """
+        Insère ou met à jour les lignes d'un paquet. Seuls les champs présents dans
+        une ligne sont mis à jour en cas de conflit, pour ne pas effacer (ex. image)
+        ce que le fichier ne fournit pas : les lignes sont donc regroupées par
+        ensemble de colonnes, un bulk_create par groupe.
+        """
+        groups = {}
+        for _, instance, columns in rows:
+            update_fields = tuple(field for field in fields if field in columns) + tuple(always)
+            groups.setdefault(update_fields, []).append(instance)
+        # bulk_create ne déclenche pas les signaux : les index dérivés sont reconstruits à la fin
+        for update_fields, instances in groups.items():
+            model.objects.bulk_create(
+                instances, batch_size=self.batch_size, update_conflicts=True,
+                unique_fields=['external_id'], update_fields=list(update_fields),
+            )
+
+    def _save_sites(self, path, rows):
+        sites = [site for _, site, _ in rows]
+        with transaction.atomic():
+            self._upsert(TouristicSite, rows, SITE_FIELDS)
+            self.site_ids.update(
+                TouristicSite.objects
+                .filter(external_id__in=[site.external_id for site in sites])
+                .values_list('external_id', 'pk')
+            )
+        self.with_images = self.with_images or any(site.image for site in sites)
+        return len(sites)
+
+    def _save_services(self, path, rows):
+        unknown = {service.site_external_id for _, service, _ in rows} - self.site_ids.keys()
+        if unknown:
+            self.site_ids.update(
+                TouristicSite.objects.filter(external_id__in=unknown).values_list('external_id', 'pk')
+            )
+
+        resolved = []
+        for number, service, columns in rows:
+            site_id = self.site_ids.get(service.site_external_id)
+            if site_id is None:
+                self._reject(path, number, ValidationError(
+                    {SITE_REFERENCE: f"Site introuvable: {service.site_external_id}"}
+                ))
+                continue
+            service.site_id = site_id
+            resolved.append((number, service, columns))
+
+        with transaction.atomic():
+            self._upsert(Service, resolved, SERVICE_FIELDS, always=['site'])
+        return len(resolved)
+
+    def _rebuild_derived(self, skip_derivatives):
+        """
+        Reconstruit une seule fois les caches dérivés du catalogue, dans ce processus
+        et, via les jetons de version, dans les workers du serveur.
+        """
+        site_distances.invalidate()
+        rebuild_search_indexes([TouristicSite, Service])
+        bump_catalog_version(TouristicSite, Service)
+        if os.path.exists(snapshot_path()):
+            site_count, service_count = write_snapshot()
+            self.stdout.write(f"Snapshot régénéré: {site_count} sites, {service_count} services")
+        if self.with_images and not skip_derivatives:
+            call_command('generate_image_derivatives', stdout=self.stdout, stderr=self.stderr)
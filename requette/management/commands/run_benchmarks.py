@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from requette.benchmarks import BenchmarkRunner, compare, failed_cases
+
+
+class Command(BaseCommand):
+    help = "Mesure la latence (p50/p95/p99), le débit et le nombre de requêtes SQL par endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--include-writes', action='store_true',
+                            help="Inclut complete_action (modifie la base)")
+        parser.add_argument('--output', default='benchmark.json',
+                            help="Fichier JSON du rapport")
+        parser.add_argument('--baseline', default=None,
+                            help="Rapport JSON précédent à comparer")
+        parser.add_argument('--allow-errors', action='store_true',
+                            help="Avertit seulement (au lieu d'échouer) si des requêtes ont échoué")
+
+    def handle(self, *args, **options):
+        runner = BenchmarkRunner(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            include_writes=options['include_writes'],
+            seed=options['seed'],
+        )
+        report = runner.run()
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                report['comparison'] = compare(report, json.load(f))
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        self.stdout.write(f"{'endpoint':45} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} {'SQL':>6} {'err':>4}")
+        for name, r in report['results'].items():
+            self.stdout.write(
+                f"{name:45} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} "
+                f"{r['throughput_rps']:>8} {r['queries_per_request']:>6} {r['errors']:>4}"
+            )
+        for name, delta in report.get('comparison', {}).items():
+            self.stdout.write(f"{name:45} p50 {delta['p50_ms']:+}%  p95 {delta['p95_ms']:+}%"
+                              if None not in delta.values() else f"{name:45} n/a")
+        self.stdout.write(f"Rapport écrit dans {options['output']}")
+
+        # Les latences d'un cas en erreur ne mesurent pas le chemin nominal
+        failed = failed_cases(report)
+        if failed:
+            message = "Requêtes en erreur, mesures non représentatives : " + ', '.join(
+                f"{name} ({errors}/{report['results'][name]['count']})" for name, errors in failed.items()
+            )
+            if not options['allow_errors']:
+                raise CommandError(message)
+            self.stderr.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Aucune erreur"))
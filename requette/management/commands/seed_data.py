@@ -0,0 +1,124 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from requette.catalog_version import bump_catalog_version
+from requette.models import TouristicSite, Service, EcoAction, UserProfile, UserAction
+
+# Pôles touristiques (latitude, longitude, dispersion en degrés) autour desquels
+# les sites et services sont regroupés, comme dans les données réelles.
+CLUSTERS = [
+    ('Yaoundé', 3.848, 11.502, 0.08),
+    ('Douala', 4.051, 9.768, 0.10),
+    ('Kribi', 2.939, 9.910, 0.06),
+    ('Limbé', 4.022, 9.195, 0.05),
+    ('Bafoussam', 5.478, 10.418, 0.07),
+    ('Garoua', 9.301, 13.397, 0.09),
+    ('Waza', 11.333, 14.667, 0.25),
+]
+SITE_TYPES = ['MONUMENT', 'MUSEUM', 'NATURE']
+SERVICE_TYPES = ['HOTEL', 'RESTAURANT', 'OTHER']
+ECO_ACTIONS = [
+    ('Ramasser des déchets', 50),
+    ('Utiliser une gourde', 10),
+    ('Visiter à vélo', 30),
+    ('Choisir un hébergement éco-responsable', 40),
+    ('Participer à un reboisement', 100),
+    ('Acheter local', 20),
+]
+WORDS = ['forêt', 'plage', 'cascade', 'marché', 'palais', 'musée', 'montagne', 'lac',
+         'artisanat', 'histoire', 'faune', 'culture', 'panorama', 'village', 'réserve']
+
+
+class Command(BaseCommand):
+    help = "Génère des données synthétiques (sites, services, profils, actions) pour les benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', type=int, default=1000)
+        parser.add_argument('--services-per-site', type=int, default=5)
+        parser.add_argument('--profiles', type=int, default=500)
+        parser.add_argument('--actions-per-profile', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _point(self, rng, cluster):
+        _, latitude, longitude, spread = cluster
+        return rng.gauss(latitude, spread), rng.gauss(longitude, spread)
+
+    def _text(self, rng, count):
+        return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        run = timezone.now().strftime('%Y%m%d%H%M%S')
+
+        sites = []
+        for i in range(options['sites']):
+            cluster = rng.choice(CLUSTERS)
+            latitude, longitude = self._point(rng, cluster)
+            sites.append(TouristicSite(
+                name=f"{cluster[0]} {self._text(rng, 2)} {i}",
+                description=self._text(rng, 30),
+                type=rng.choice(SITE_TYPES),
+                latitude=latitude,
+                longitude=longitude,
+                image='',
+                eco_score=rng.randint(1, 5),
+            ))
+        sites = TouristicSite.objects.bulk_create(sites, batch_size=batch_size)
+
+        services = []
+        for site in sites:
+            for j in range(options['services_per_site']):
+                services.append(Service(
+                    name=f"{self._text(rng, 2).title()} {site.id}-{j}",
+                    type=rng.choice(SERVICE_TYPES),
+                    description=self._text(rng, 20),
+                    eco_friendly=rng.random() < 0.3,
+                    latitude=rng.gauss(site.latitude, 0.01),
+                    longitude=rng.gauss(site.longitude, 0.01),
+                    site=site,
+                ))
+        Service.objects.bulk_create(services, batch_size=batch_size)
+
+        actions = EcoAction.objects.bulk_create([
+            EcoAction(name=name, description=name, points=points) for name, points in ECO_ACTIONS
+        ])
+
+        User.objects.bulk_create([
+            User(username=f'bench_{run}_{i}', password='!') for i in range(options['profiles'])
+        ], batch_size=batch_size)
+        users = User.objects.filter(username__startswith=f'bench_{run}_')
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(user=user) for user in users
+        ], batch_size=batch_size)
+
+        now = timezone.now()
+        user_actions = []
+        for profile in profiles:
+            points = 0
+            for _ in range(options['actions_per_profile']):
+                action = rng.choice(actions)
+                points += action.points
+                user_actions.append(UserAction(user_profile=profile, action=action))
+            profile.eco_points = points
+            profile.level = max(1, int((points / 100) ** 0.5))
+        user_actions = UserAction.objects.bulk_create(user_actions, batch_size=batch_size)
+        # completed_at est en auto_now_add : on étale les dates après coup
+        for user_action in user_actions:
+            user_action.completed_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        UserAction.objects.bulk_update(user_actions, ['completed_at'], batch_size=batch_size)
+        UserProfile.objects.bulk_update(profiles, ['eco_points', 'level'], batch_size=batch_size)
+        # bulk_create n'envoie pas de signaux : les caches des workers se rechargeront
+        transaction.on_commit(lambda: bump_catalog_version(TouristicSite, Service))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(sites)} sites, {len(services)} services, {len(profiles)} profils, "
+            f"{len(user_actions)} actions utilisateur créés"
+        ))
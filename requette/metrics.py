@@ -0,0 +1,276 @@
+# metrics.py
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+
+slow_logger = logging.getLogger('requette.metrics.slow')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# Mesures en cours, éventuellement imbriquées : chaque requête SQL est comptée dans chacune
+_active_samples = contextvars.ContextVar('requette_metrics_samples', default=())
+
+
+class Sample:
+    """
+    Mesures collectées pendant une requête HTTP ou un message WebSocket.
+    """
+
+    def __init__(self, transport, endpoint, capture_sql=False):
+        self.transport = transport
+        self.endpoint = endpoint
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serialization_time = 0.0
+        self.queries = [] if capture_sql else None
+
+
+class Histogram:
+    """
+    Histogramme cumulatif à seuils fixes, au format Prometheus.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Agrège les mesures en mémoire, par transport (http/ws) et par endpoint.
+    Les valeurs sont propres au processus.
+    """
+
+    METRICS = {
+        'requette_request_duration_seconds': ('Durée totale de traitement', DURATION_BUCKETS),
+        'requette_db_queries': ('Nombre de requêtes SQL', QUERY_COUNT_BUCKETS),
+        'requette_db_duration_seconds': ('Temps passé dans les requêtes SQL', DURATION_BUCKETS),
+        'requette_serialization_duration_seconds': (
+            'Temps de sérialisation de la réponse (Serializer.data et encodage)', DURATION_BUCKETS
+        ),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in self.METRICS}
+
+    def _observe(self, name, labels, value):
+        histogram = self._histograms[name].get(labels)
+        if histogram is None:
+            histogram = self._histograms[name][labels] = Histogram(self.METRICS[name][1])
+        histogram.observe(value)
+
+    def record(self, sample, duration):
+        labels = (sample.transport, sample.endpoint)
+        with self._lock:
+            self._observe('requette_request_duration_seconds', labels, duration)
+            self._observe('requette_db_queries', labels, sample.query_count)
+            self._observe('requette_db_duration_seconds', labels, sample.query_time)
+            self._observe('requette_serialization_duration_seconds', labels, sample.serialization_time)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {name: {} for name in self.METRICS}
+
+    def render(self):
+        """
+        Exporte toutes les séries au format texte Prometheus (version 0.0.4).
+        """
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets) in self.METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (transport, endpoint), histogram in sorted(self._histograms[name].items()):
+                    labels = f'transport="{_escape(transport)}",endpoint="{_escape(endpoint)}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(float(bound))
+                        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum!r}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def _slow_threshold():
+    threshold_ms = getattr(settings, 'METRICS_SLOW_REQUEST_MS', None)
+    return None if threshold_ms is None else threshold_ms / 1000
+
+
+@contextmanager
+def track(transport, endpoint='unknown'):
+    """
+    Mesure un bloc de code (requête ou message) et l'enregistre dans le registre.
+    `sample.endpoint` peut être précisé pendant l'exécution.
+    """
+    threshold = _slow_threshold()
+    sample = Sample(transport, endpoint, capture_sql=threshold is not None)
+    start = time.perf_counter()
+    try:
+        with collect(sample):
+            yield sample
+    finally:
+        duration = time.perf_counter() - start
+        registry.record(sample, duration)
+        if threshold is not None and duration >= threshold:
+            slow_logger.warning(
+                "Requête lente %s %s: %.1f ms, %d requête(s) SQL (%.1f ms)\n%s",
+                transport, sample.endpoint, duration * 1000, sample.query_count,
+                sample.query_time * 1000,
+                '\n'.join(f'  [{t * 1000:.1f} ms] {sql}' for sql, t in sample.queries),
+            )
+
+
+@contextmanager
+def collect(sample):
+    """
+    Rattache `sample` au contexte courant sans l'enregistrer dans le registre.
+    """
+    token = _active_samples.set(_active_samples.get() + (sample,))
+    try:
+        yield sample
+    finally:
+        _active_samples.reset(token)
+
+
+@contextmanager
+def track_serialization():
+    samples = _active_samples.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for sample in samples:
+            sample.serialization_time += elapsed
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    execute_wrapper installé sur chaque connexion : compte et chronomètre
+    les requêtes SQL de la requête en cours.
+    """
+    samples = _active_samples.get()
+    if not samples:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        for sample in samples:
+            sample.query_count += 1
+            sample.query_time += elapsed
+            if sample.queries is not None:
+                sample.queries.append((sql, elapsed))
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def endpoint_name(request):
+    """
+    Nom lisible de la vue résolue, ex: TouristicSiteViewSet.nearby_services
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is not None:
+        actions = getattr(view, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{cls.__name__}.{action}'
+    return match.view_name or getattr(view, '__qualname__', 'unknown')
+
+
+class PerformanceMetricsMiddleware:
+    """
+    Mesure chaque requête HTTP : durée, requêtes SQL et temps de sérialisation.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track('http') as sample:
+            response = self.get_response(request)
+            sample.endpoint = endpoint_name(request)
+        return response
+
+    async def __acall__(self, request):
+        with track('http') as sample:
+            response = await self.get_response(request)
+            sample.endpoint = endpoint_name(request)
+        return response
+
+
+class TimedSerializerMixin:
+    """
+    Compte la construction de `Serializer.data` (to_representation, y compris la lecture
+    d'un queryset paresseux) dans le temps de sérialisation, en plus de l'encodage
+    mesuré par les renderers.
+    """
+
+    @property
+    def data(self):
+        with track_serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    À déclarer en `Meta.list_serializer_class` pour chronométrer aussi les `many=True`.
+    """
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedBrowsableAPIRenderer(BrowsableAPIRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with track_serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def metrics_view(request):
+    """
+    Expose les histogrammes au format texte Prometheus.
+    """
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+# Tables FTS5 "à contenu externe" : le texte reste dans la table du modèle,
+# l'index inversé est tenu à jour par des triggers (y compris pour bulk_create).
+FTS_TABLES = {
+    'requette_touristicsite': ('name', 'description', 'type'),
+    'requette_service': ('name', 'description', 'type'),
+}
+
+
+def create_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, columns in FTS_TABLES.items():
+        fts = f'{table}_fts'
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f'new.{c}' for c in columns)
+        old_cols = ', '.join(f'old.{c}' for c in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in FTS_TABLES:
+        fts = f'{table}_fts'
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requette', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
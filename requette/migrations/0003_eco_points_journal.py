@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requette', '0002_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EcoPointsJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='requette.userprofile')),
+            ],
+        ),
+    ]
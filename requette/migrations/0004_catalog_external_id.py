@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:54
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+fulltext_search = import_module('requette.migrations.0002_fulltext_search')
+
+
+def recreate_fts_tables(apps, schema_editor):
+    # Sous SQLite, ajouter une colonne unique reconstruit la table et supprime
+    # ses triggers : on recrée les tables FTS et leurs triggers, puis on réindexe.
+    fulltext_search.drop_fts_tables(apps, schema_editor)
+    fulltext_search.create_fts_tables(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requette', '0003_eco_points_journal'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts_tables),
+        migrations.AddField(
+            model_name='service',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='touristicsite',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(recreate_fts_tables, migrations.RunPython.noop),
+    ]
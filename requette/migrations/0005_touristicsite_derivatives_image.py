@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requette', '0004_catalog_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='touristicsite',
+            name='derivatives_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+    ]
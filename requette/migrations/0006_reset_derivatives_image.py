@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def reset_derivatives_image(apps, schema_editor):
+    # Les dérivés sont désormais nommés d'après le nom complet de l'image (2.png_thumbnail.webp) :
+    # ceux générés avec l'ancien nom (2_thumbnail.webp) ne sont plus exposés, generate_image_derivatives
+    # les régénère.
+    TouristicSite = apps.get_model('requette', 'TouristicSite')
+    TouristicSite.objects.exclude(derivatives_image=None).update(derivatives_image=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requette', '0005_touristicsite_derivatives_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_derivatives_image, migrations.RunPython.noop),
+    ]
@@ -18,6 +18,10 @@ class TouristicSite(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(5)]
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Identifiant dans la source d'import (import_catalog)
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    # Nom de l'image dont les miniatures sont générées (voir images.mark_derivatives_ready)
+    derivatives_image = models.CharField(max_length=100, null=True, blank=True, editable=False)
 
 class Service(models.Model):
     name = models.CharField(max_length=200)
@@ -31,6 +35,7 @@ class Service(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     site = models.ForeignKey(TouristicSite, on_delete=models.CASCADE, related_name='services')
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
 class EcoAction(models.Model):
     name = models.CharField(max_length=200)
@@ -49,3 +54,8 @@ class UserAction(models.Model):
     action = models.ForeignKey(EcoAction, on_delete=models.CASCADE)
     completed_at = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
+
+class EcoPointsJournal(models.Model):
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+    points = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,62 @@
+# routers.py
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_only = contextvars.ContextVar('requette_read_only_request', default=False)
+
+
+class ReadOnlyRequestMiddleware:
+    """
+    Marque les requêtes GET/HEAD/OPTIONS comme lecture seule pour que
+    ReadReplicaRouter envoie leurs lectures sur l'alias 'replica'.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _read_only.set(request.method in SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_only.reset(token)
+
+    async def __acall__(self, request):
+        token = _read_only.set(request.method in SAFE_METHODS)
+        try:
+            return await self.get_response(request)
+        finally:
+            _read_only.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Envoie les lectures des requêtes en lecture seule vers 'replica' ;
+    tout le reste (écritures, lectures d'une requête POST) reste sur 'default',
+    ce qui garantit qu'une vue qui écrit relit ses propres données.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_only.get():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les deux alias pointent sur la même base
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
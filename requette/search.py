@@ -0,0 +1,241 @@
+# search.py
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connections, router
+from django.db.models import Case, When, IntegerField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .catalog_version import model_version
+
+# Poids des colonnes pour le classement : le nom compte plus que la description
+FIELD_WEIGHTS = {'name': 10.0, 'type': 2.0, 'description': 1.0}
+# Colonnes des tables FTS5, dans l'ordre de la migration 0002
+FTS_COLUMNS = ('name', 'description', 'type')
+# Résultats classés par pertinence au plus (sans `?ordering=`, tous les résultats sont renvoyés)
+SEARCH_MAX_RESULTS = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Découpe un texte en mots normalisés (minuscules, sans accents),
+    comme le tokenizer unicode61 de FTS5.
+    """
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(text)
+
+
+class InvertedIndex:
+    """
+    Index inversé en mémoire utilisé quand la base ne fournit pas FTS5.
+    Associe chaque mot à {pk: poids} et garde un vocabulaire trié
+    pour la recherche par préfixe (autocomplétion).
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._vocabulary = []
+        self._version = None
+
+    def _index_document(self, pk, values):
+        weights = defaultdict(float)
+        for field in self.fields:
+            for token in tokenize(values.get(field) or ''):
+                weights[token] += FIELD_WEIGHTS.get(field, 1.0)
+        self._documents[pk] = set(weights)
+        for token, weight in weights.items():
+            self._postings[token][pk] = weight
+
+    def _unindex_document(self, pk):
+        for token in self._documents.pop(pk, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(pk, None)
+                if not postings:
+                    del self._postings[token]
+
+    def load(self):
+        with self._lock:
+            self._version = model_version(self.model).current(refresh=True)
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            for values in self.model._default_manager.values('pk', *self.fields).iterator():
+                self._index_document(values['pk'], values)
+            self._vocabulary = sorted(self._postings)
+            self._loaded = True
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def update(self, instance):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._unindex_document(instance.pk)
+            self._index_document(instance.pk, {f: getattr(instance, f) for f in self.fields})
+            self._vocabulary = sorted(self._postings)
+
+    def remove(self, pk):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._unindex_document(pk)
+            self._vocabulary = sorted(self._postings)
+
+    def _expand(self, prefix):
+        start = bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def search(self, terms, limit=SEARCH_MAX_RESULTS):
+        """
+        Retourne les pk des documents contenant tous les termes (par préfixe),
+        classés par score TF-IDF pondéré décroissant (tous si `limit` vaut None).
+        """
+        with self._lock:
+            if not self._loaded or model_version(self.model).current() != self._version:
+                self.load()
+            total = len(self._documents) or 1
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._expand(term):
+                    postings = self._postings[token]
+                    idf = math.log(1 + total / len(postings))
+                    for pk, weight in postings.items():
+                        term_scores[pk] += weight * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: s + term_scores[pk] for pk, s in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            return [pk for pk, _ in ranked[:limit]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_inverted_index(model, fields):
+    with _indexes_lock:
+        index = _indexes.get(model)
+        if index is None:
+            index = _indexes[model] = InvertedIndex(model, tuple(fields))
+        return index
+
+
+def update_search_index(instance):
+    index = _indexes.get(type(instance))
+    if index is not None:
+        index.update(instance)
+
+
+def remove_from_search_index(model, pk):
+    index = _indexes.get(model)
+    if index is not None:
+        index.remove(pk)
+
+
+def rebuild_search_indexes(models):
+    """
+    À appeler une fois après un import massif (bulk_create ne déclenche pas les signaux) :
+    les index en mémoire de ce processus seront rechargés au prochain accès et les
+    tables FTS5, alimentées ligne à ligne par les triggers, sont compactées.
+    Les autres processus sont prévenus par bump_catalog_version.
+    """
+    for model in models:
+        index = _indexes.get(model)
+        if index is not None:
+            index.invalidate()
+        connection = connections[router.db_for_write(model)]
+        fts_table = f'{model._meta.db_table}_fts'
+        if _has_fts_table(connection, fts_table):
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+
+
+def _has_fts_table(connection, table):
+    cache = connection.__dict__.setdefault('_requette_fts_tables', {})
+    if table not in cache:
+        cache[table] = (
+            connection.vendor == 'sqlite'
+            and table in connection.introspection.table_names(include_views=False)
+        )
+    return cache[table]
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Remplace le `LIKE '%terme%'` de SearchFilter par une recherche plein texte classée.
+
+    - SQLite : table FTS5 `<table>_fts` (voir migration 0002), classement bm25
+    - Autres bases : index inversé en mémoire, classement TF-IDF
+    Chaque terme est cherché par préfixe pour permettre l'autocomplétion.
+    Les résultats sont triés par pertinence et limités aux SEARCH_MAX_RESULTS
+    meilleurs ; si un `?ordering=` valide est fourni, tous les résultats sont
+    renvoyés, dans cet ordre.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = [token for term in self.get_search_terms(request) for token in tokenize(term)]
+        if not search_fields or not terms:
+            return queryset
+
+        model = queryset.model
+        connection = connections[router.db_for_read(model)]
+        fts_table = f'{model._meta.db_table}_fts'
+        # Trié ensuite par OrderingFilter : le classement (et donc la limite) ne sert à rien
+        ordered = bool(filters.OrderingFilter().get_ordering(request, queryset, view))
+        if _has_fts_table(connection, fts_table):
+            match = self._fts_match(search_fields, terms)
+            if ordered:
+                return queryset.filter(pk__in=RawSQL(
+                    f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match]
+                ))
+            pks = self._fts_search(connection, fts_table, search_fields, match)
+        else:
+            pks = get_inverted_index(model, search_fields).search(
+                terms, limit=None if ordered else SEARCH_MAX_RESULTS
+            )
+            if ordered:
+                return queryset.filter(pk__in=pks)
+
+        if not pks:
+            return queryset.none()
+        return queryset.filter(pk__in=pks).order_by(
+            Case(*[When(pk=pk, then=rank) for rank, pk in enumerate(pks)], output_field=IntegerField())
+        )
+
+    def _fts_match(self, search_fields, terms):
+        columns = [f for f in FTS_COLUMNS if f in search_fields]
+        query = ' '.join(f'"{term}"*' for term in terms)
+        return '{%s} : (%s)' % (' '.join(columns), query)
+
+    def _fts_search(self, connection, fts_table, search_fields, match):
+        weights = ', '.join(str(FIELD_WEIGHTS[f] if f in search_fields else 0.0) for f in FTS_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s '
+                f'ORDER BY bm25({fts_table}, {weights}) LIMIT %s',
+                [match, SEARCH_MAX_RESULTS]
+            )
+            return [row[0] for row in cursor.fetchall()]
@@ -1,28 +1,47 @@
 # serializers.py
 from rest_framework import serializers
 from .models import TouristicSite, Service, EcoAction, UserProfile, UserAction
+from .images import derivative_urls
+from .eco_points import effective_points
+from .metrics import TimedListSerializer, TimedSerializerMixin
+
+class TouristicSiteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image_derivatives = serializers.SerializerMethodField()
+
+    def get_image_derivatives(self, obj):
+        return derivative_urls(obj)
 
-class TouristicSiteSerializer(serializers.ModelSerializer):
     class Meta:
         model = TouristicSite
-        fields = '__all__'
+        list_serializer_class = TimedListSerializer
+        exclude = ['derivatives_image']
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Service
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class EcoActionSerializer(serializers.ModelSerializer):
+class EcoActionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = EcoAction
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Inclut les points encore dans le journal (mode write-behind)
+        data['eco_points'], data['level'] = effective_points(instance)
+        return data
+
     class Meta:
         model = UserProfile
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class UserActionSerializer (serializers.ModelSerializer):
+class UserActionSerializer (TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserAction
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
\ No newline at end of file
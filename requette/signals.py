@@ -0,0 +1,80 @@
+# signals.py
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import TouristicSite, Service
+from .itinerary import site_distances
+from .search import update_search_index, remove_from_search_index
+from .images import has_derivatives, mark_derivatives_ready, schedule_derivatives
+from .snapshot import schedule_rebuild
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=TouristicSite)
+def update_site_distances(sender, instance, **kwargs):
+    """
+    Met à jour la ligne du site dans la matrice des distances.
+    """
+    site_distances.upsert(instance.id, instance.latitude, instance.longitude)
+
+
+@receiver(post_delete, sender=TouristicSite)
+def remove_site_distances(sender, instance, **kwargs):
+    """
+    Retire le site supprimé de la matrice des distances.
+    """
+    site_distances.remove(instance.id)
+
+
+@receiver(post_save, sender=TouristicSite)
+@receiver(post_save, sender=Service)
+def update_search_indexes(sender, instance, **kwargs):
+    """
+    Met à jour l'index inversé de repli (bases sans FTS5).
+    """
+    update_search_index(instance)
+
+
+@receiver(post_delete, sender=TouristicSite)
+@receiver(post_delete, sender=Service)
+def remove_from_search_indexes(sender, instance, **kwargs):
+    """
+    Retire l'objet supprimé de l'index inversé de repli.
+    """
+    remove_from_search_index(sender, instance.pk)
+
+
+@receiver(post_save, sender=TouristicSite)
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    """
+    Lance la génération des miniatures quand l'image du site n'en a pas encore.
+    """
+    if raw or not instance.image:
+        return
+    image = instance.image
+
+    def schedule():
+        try:
+            if not has_derivatives(image.name):
+                schedule_derivatives(image)
+            elif instance.derivatives_image != image.name:
+                mark_derivatives_ready(image.name)
+        except Exception:
+            logger.exception("Impossible de générer les dérivés pour %s", image.name)
+
+    transaction.on_commit(schedule)
+
+
+@receiver(post_save, sender=TouristicSite)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=TouristicSite)
+@receiver(post_delete, sender=Service)
+def rebuild_catalog_snapshot(sender, **kwargs):
+    """
+    Régénère le snapshot du catalogue après validation de la transaction.
+    """
+    transaction.on_commit(schedule_rebuild)
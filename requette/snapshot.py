@@ -0,0 +1,276 @@
+# snapshot.py
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connections
+
+from .models import TouristicSite, Service
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'RGCS'
+VERSION = 1
+BYTE_ORDER_MARK = 0x0102
+# magic, version, marque d'ordre des octets, nb sites, nb services, date de génération
+HEADER = struct.Struct('=4sHHIId')
+KM_PER_DEGREE = 111.2
+
+# Colonnes stockées, dans l'ordre du fichier (chaque colonne est alignée sur 8 octets)
+SITE_COLUMNS = (('id', 'q'), ('latitude', 'd'), ('longitude', 'd'), ('type', 'B'), ('eco_score', 'B'))
+SERVICE_COLUMNS = (
+    ('id', 'q'), ('site_id', 'q'), ('latitude', 'd'), ('longitude', 'd'),
+    ('type', 'B'), ('eco_friendly', 'B'),
+)
+SITE_TYPES = [code for code, _ in TouristicSite._meta.get_field('type').choices]
+SERVICE_TYPES = [code for code, _ in Service._meta.get_field('type').choices]
+
+REBUILD_DELAY = 1.0
+
+
+def snapshot_path():
+    return getattr(settings, 'CATALOG_SNAPSHOT_PATH', settings.BASE_DIR / 'catalog.snapshot')
+
+
+def _padding(size):
+    return -size % 8
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _collect(queryset, columns, convert):
+    """
+    Lit les lignes du queryset colonne par colonne dans des array typés.
+    """
+    arrays = [array(typecode) for _, typecode in columns]
+    for row in queryset.values_list(*(name for name, _ in columns)).iterator():
+        for column, value in zip(arrays, convert(row)):
+            column.append(value)
+    return {name: column for (name, _), column in zip(columns, arrays)}
+
+
+def write_snapshot(path=None):
+    """
+    Écrit le snapshot du catalogue (sites et services triés par latitude).
+    Le fichier est remplacé de façon atomique : les processus qui ont encore
+    l'ancien fichier en mémoire continuent de le lire sans erreur.
+
+    Returns:
+        tuple: (nombre de sites, nombre de services)
+    """
+    path = str(path or snapshot_path())
+    site_types = {code: i for i, code in enumerate(SITE_TYPES)}
+    service_types = {code: i for i, code in enumerate(SERVICE_TYPES)}
+
+    sites = _collect(
+        TouristicSite.objects.order_by('latitude'), SITE_COLUMNS,
+        lambda row: row[:3] + (site_types.get(row[3], 255), row[4]),
+    )
+    services = _collect(
+        Service.objects.order_by('latitude'), SERVICE_COLUMNS,
+        lambda row: row[:4] + (service_types.get(row[4], 255), row[5]),
+    )
+
+    site_count = len(sites['id'])
+    service_count = len(services['id'])
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, site_count, service_count, time.time()))
+            f.write(b'\0' * _padding(HEADER.size))
+            for columns in (sites, services):
+                for column in columns.values():
+                    data = column.tobytes()
+                    f.write(data)
+                    f.write(b'\0' * _padding(len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return site_count, service_count
+
+
+class _Table:
+    """
+    Vue en colonnes (memoryview sans copie) sur une partie du fichier mappé.
+    """
+
+    def __init__(self, buffer, offset, count, columns):
+        self.count = count
+        for name, typecode in columns:
+            size = count * struct.calcsize(typecode)
+            setattr(self, name, buffer[offset:offset + size].cast(typecode))
+            offset += size + _padding(size)
+        self.end = offset
+
+    def within(self, latitude, longitude, radius):
+        """
+        Retourne [(position, distance)] des lignes à moins de `radius` km, triées par distance.
+        Les lignes étant triées par latitude, seule la bande de latitude utile est parcourue.
+        """
+        lat_delta = radius / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(latitude))
+        lon_delta = radius / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-6 else 360.0
+        start = bisect_left(self.latitude, latitude - lat_delta)
+        stop = bisect_right(self.latitude, latitude + lat_delta)
+        found = []
+        for position in range(start, stop):
+            lon = self.longitude[position]
+            if abs(lon - longitude) > lon_delta and lon_delta < 180:
+                continue
+            distance = _haversine(latitude, longitude, self.latitude[position], lon)
+            if distance <= radius:
+                found.append((position, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+class CatalogSnapshot:
+    """
+    Snapshot binaire du catalogue, mappé en mémoire en lecture seule.
+
+    Tous les processus qui ouvrent le même fichier partagent les mêmes pages
+    du cache système : aucune copie par worker, ouverture quasi instantanée.
+    Le fichier est rouvert automatiquement quand il a été régénéré.
+    """
+
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._stat = None
+        self._checked_at = 0.0
+        self.sites = None
+        self.services = None
+        self.generated_at = None
+
+    @property
+    def path(self):
+        return str(self._path or snapshot_path())
+
+    def open(self):
+        """
+        Mappe le fichier s'il existe. Retourne False si aucun snapshot n'est disponible.
+        """
+        with self._lock:
+            return self._open()
+
+    def _open(self):
+        self._checked_at = time.monotonic()
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            self._mmap = self._stat = self.sites = self.services = None
+            return False
+
+        buffer = memoryview(mapped)
+        magic, version, bom, site_count, service_count, generated_at = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION or bom != BYTE_ORDER_MARK:
+            logger.warning("Snapshot du catalogue invalide ou incompatible: %s", self.path)
+            self._mmap = self._stat = self.sites = self.services = None
+            return False
+
+        offset = HEADER.size + _padding(HEADER.size)
+        self.sites = _Table(buffer, offset, site_count, SITE_COLUMNS)
+        self.services = _Table(buffer, self.sites.end, service_count, SERVICE_COLUMNS)
+        self.generated_at = generated_at
+        # L'ancien mmap reste valide tant que des vues l'utilisent encore
+        self._mmap = mapped
+        self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        return True
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                current = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                current = None
+            if current != self._stat:
+                self._open()
+
+    @property
+    def available(self):
+        self._refresh()
+        return self.services is not None
+
+    def nearby_services(self, latitude, longitude, radius=5, eco_friendly=None):
+        """
+        Retourne [(service_id, distance_km)] triés par distance, ou None sans snapshot.
+        """
+        self._refresh()
+        services = self.services
+        if services is None:
+            return None
+        return [
+            (services.id[position], distance)
+            for position, distance in services.within(latitude, longitude, radius)
+            if eco_friendly is None or bool(services.eco_friendly[position]) == eco_friendly
+        ]
+
+    def nearby_sites(self, latitude, longitude, radius=5):
+        """
+        Retourne [(site_id, distance_km)] triés par distance, ou None sans snapshot.
+        """
+        self._refresh()
+        sites = self.sites
+        if sites is None:
+            return None
+        return [(sites.id[position], distance) for position, distance in sites.within(latitude, longitude, radius)]
+
+
+catalog_snapshot = CatalogSnapshot()
+
+_rebuild_timer = None
+_rebuild_lock = threading.Lock()
+
+
+def _rebuild():
+    global _rebuild_timer
+    with _rebuild_lock:
+        _rebuild_timer = None
+    try:
+        write_snapshot()
+    except Exception:
+        logger.exception("Échec de la régénération du snapshot du catalogue")
+    finally:
+        connections.close_all()
+
+
+def schedule_rebuild():
+    """
+    Régénère le snapshot peu après une écriture, en regroupant les écritures rapprochées.
+    Ne fait rien tant qu'aucun snapshot n'a été créé (build_catalog_snapshot).
+    """
+    global _rebuild_timer
+    if not os.path.exists(snapshot_path()):
+        return
+    with _rebuild_lock:
+        if _rebuild_timer is None:
+            _rebuild_timer = threading.Timer(REBUILD_DELAY, _rebuild)
+            _rebuild_timer.daemon = True
+            _rebuild_timer.start()
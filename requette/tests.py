@@ -1,3 +1,1090 @@
-from django.test import TestCase
+import os
+import sys
+import tempfile
+import threading
+import importlib.util
+import json
+import math
+import time
+from io import BytesIO, StringIO
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import eco_points, search
+from .catalog_version import ModelVersion, model_version
+from .management.commands import import_catalog
+from .benchmarks import WRITE_CASES, BenchmarkRunner, failed_cases, percentile
+from .consumers import TourismConsumer
+from .images import DERIVATIVE_FORMATS, DERIVATIVE_SIZES, derivative_name, render_derivatives
+from .metrics import Histogram, MetricsRegistry, Sample, collect, registry
+from .itinerary import SiteDistanceMatrix, site_distances, two_opt, plan_itinerary
+from .models import TouristicSite, Service, EcoAction, EcoPointsJournal, UserAction, UserProfile
+from .serializer import TouristicSiteSerializer
+from .snapshot import CatalogSnapshot, _haversine, catalog_snapshot, write_snapshot
+
+
+def create_site(name='Site', latitude=3.85, longitude=11.5, **fields):
+    fields.setdefault('description', 'Site de test')
+    fields.setdefault('type', 'NATURE')
+    fields.setdefault('eco_score', 3)
+    fields.setdefault('image', '')
+    return TouristicSite.objects.create(name=name, latitude=latitude, longitude=longitude, **fields)
+
+
+def site_coordinates(ids):
+    """
+    [(id, latitude, longitude)] lus en base, dans l'ordre des IDs, comme plan_itinerary.
+    """
+    rows = TouristicSite.objects.in_bulk(ids)
+    return [(site_id, rows[site_id].latitude, rows[site_id].longitude) for site_id in ids]
+
+
+class ProductionSQLiteProfileTests(SimpleTestCase):
+    """
+    Vérifie qu'avec le profil de production (WAL), une écriture en cours
+    ne bloque pas les lectures sur l'alias 'replica'.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        name = os.path.join(directory.name, 'db.sqlite3')
+        self.connections = ConnectionHandler({
+            'default': {},
+            'writer': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': name,
+                'OPTIONS': settings.SQLITE_PRODUCTION_OPTIONS,
+            },
+            'reader': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': name,
+                'OPTIONS': settings.SQLITE_REPLICA_OPTIONS,
+            },
+        })
+        with self.connections['writer'].cursor() as cursor:
+            cursor.execute('CREATE TABLE points (profile_id INTEGER, delta INTEGER)')
+            cursor.execute('INSERT INTO points VALUES (1, 10)')
+        self.addCleanup(self.connections.close_all)
+
+    def test_journal_mode_is_wal(self):
+        with self.connections['writer'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_replica_is_read_only(self):
+        with self.connections['reader'].cursor() as cursor:
+            with self.assertRaises(Exception):
+                cursor.execute('INSERT INTO points VALUES (2, 5)')
+
+    def test_writer_does_not_stall_readers(self):
+        write_started = threading.Event()
+        release_writer = threading.Event()
+        errors = []
+
+        def writer():
+            try:
+                connection = self.connections['writer']
+                with connection.cursor() as cursor:
+                    # Verrou exclusif gardé pendant les lectures : sans WAL, elles attendraient
+                    cursor.execute('BEGIN EXCLUSIVE')
+                    for i in range(1000):
+                        cursor.execute('INSERT INTO points VALUES (%s, 1)', [i])
+                    write_started.set()
+                    release_writer.wait(5)
+                    cursor.execute('COMMIT')
+                connection.close()
+            except Exception as e:
+                errors.append(e)
+                write_started.set()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            self.assertTrue(write_started.wait(5))
+            durations = []
+            with self.connections['reader'].cursor() as cursor:
+                for _ in range(20):
+                    start = time.perf_counter()
+                    cursor.execute('SELECT COUNT(*), SUM(delta) FROM points')
+                    row = cursor.fetchone()
+                    durations.append(time.perf_counter() - start)
+                    # Le lecteur voit le dernier état validé, sans attendre l'écrivain
+                    self.assertEqual(row, (1, 10))
+        finally:
+            release_writer.set()
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLess(max(durations), 0.5)
+        with self.connections['reader'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM points')
+            self.assertEqual(cursor.fetchone()[0], 1001)
+
+
+@override_settings(DATABASE_ROUTERS=['requette.routers.ReadReplicaRouter'])
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """
+    Routeur du profil de production : les lectures des requêtes GET passent par 'replica',
+    celles d'une requête POST et toutes les écritures restent sur 'default'.
+    TransactionTestCase : 'replica' est une autre connexion, qui ne voit que les données validées.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('visiteur', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, eco_points=50)
+        self.action = EcoAction.objects.create(name='Planter un arbre', description='', points=30)
+        self.site = create_site('Lac Ossa')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queries(self, request):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = request()
+        return response, [query['sql'] for query in default], [query['sql'] for query in replica]
+
+    def test_production_profile_enables_the_router(self):
+        path = os.path.join(settings.BASE_DIR, 'RangerAi', 'settings.py')
+        spec = importlib.util.spec_from_file_location('production_settings', path)
+        production = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(os.environ, RANGERAI_DB_PROFILE='production'):
+            spec.loader.exec_module(production)
+        self.assertEqual(production.DATABASE_ROUTERS, ['requette.routers.ReadReplicaRouter'])
+        self.assertEqual(set(production.DATABASES), {'default', 'replica'})
+        self.assertEqual(production.DATABASES['replica']['TEST'], {'MIRROR': 'default'})
+        self.assertIn('query_only=ON', production.DATABASES['replica']['OPTIONS']['init_command'])
+        self.assertIn('requette.routers.ReadOnlyRequestMiddleware', production.MIDDLEWARE)
+        self.assertEqual(settings.DATABASE_ROUTERS, production.DATABASE_ROUTERS)
+
+    def test_get_reads_go_to_replica(self):
+        for path in (f'/api/sites/{self.site.id}/', f'/api/async/sites/{self.site.id}/',
+                     f'/api/profiles/{self.profile.id}/statistics/'):
+            with self.subTest(path):
+                response, default, replica = self.queries(lambda: self.client.get(path))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(default, [])
+                self.assertTrue(replica)
+
+    def test_post_reads_and_writes_stay_on_default(self):
+        response, default, replica = self.queries(lambda: self.client.post(
+            f'/api/profiles/{self.profile.id}/complete_action/', {'action_id': self.action.id}))
+        self.assertEqual(response.json()['total_points'], 80)
+        self.assertEqual(replica, [])
+        self.assertTrue(any(sql.startswith('SELECT') for sql in default))
+        self.assertTrue(any(sql.startswith('INSERT') for sql in default))
+        # Hors requête : lectures et écritures sur 'default'
+        self.assertEqual(router.db_for_read(TouristicSite), 'default')
+        self.assertEqual(router.db_for_write(TouristicSite), 'default')
+
+
+class SiteDistanceMatrixTests(TestCase):
+    """
+    La matrice maintenue de façon incrémentale doit rester identique à une matrice
+    reconstruite entièrement, et l'itinéraire doit trouver les sites créés sans signal.
+    """
+
+    def setUp(self):
+        # La matrice partagée peut contenir des sites des tests précédents (annulés)
+        site_distances.invalidate()
+        # Construction synchrone : un thread ne verrait pas les données de la transaction du test
+        patcher = mock.patch.object(SiteDistanceMatrix, 'warm', SiteDistanceMatrix.load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sites = [create_site(f'Site {i}', 3.8 + i * 0.01, 11.5 + i * 0.02) for i in range(4)]
+
+    def assertMatchesFullLoad(self, matrix):
+        ids = list(matrix._ids)
+        fresh = SiteDistanceMatrix()
+        fresh.load()
+        self.assertCountEqual(ids, fresh._ids)
+        for row, expected in zip(matrix.submatrix(site_coordinates(ids)), fresh.submatrix(site_coordinates(ids))):
+            for value, expected_value in zip(row, expected):
+                self.assertAlmostEqual(value, expected_value, places=9)
+
+    def test_upsert_adds_and_moves_sites(self):
+        matrix = SiteDistanceMatrix()
+        matrix.load()
+        added = create_site('Ajouté', 4.0, 11.7)
+        matrix.upsert(added.id, added.latitude, added.longitude)
+        moved = self.sites[1]
+        moved.latitude = 3.9
+        moved.save()
+        matrix.upsert(moved.id, moved.latitude, moved.longitude)
+        self.assertMatchesFullLoad(matrix)
+
+    def test_remove_keeps_remaining_distances(self):
+        matrix = SiteDistanceMatrix()
+        matrix.load()
+        removed_ids = [self.sites[0].id, self.sites[2].id]
+        for site in (self.sites[0], self.sites[2]):
+            matrix.remove(site.id)
+            site.delete()
+        self.assertMatchesFullLoad(matrix)
+        with self.assertRaises(KeyError):
+            plan_itinerary([removed_ids[0], self.sites[1].id])
+
+    def test_cold_matrix_computes_requested_distances_directly(self):
+        matrix = SiteDistanceMatrix()
+        first, second = self.sites[:2]
+        with mock.patch.object(SiteDistanceMatrix, 'warm') as warm, CaptureQueriesContext(connection) as queries:
+            distances = matrix.submatrix(site_coordinates([first.id, second.id]))
+        warm.assert_called_once_with()
+        self.assertFalse(matrix._loaded)
+        self.assertEqual(len(queries), 1)
+        self.assertAlmostEqual(distances[0][1], _haversine(first.latitude, first.longitude,
+                                                           second.latitude, second.longitude), places=6)
+
+    def test_itinerary_sees_sites_changed_by_another_worker(self):
+        client = APIClient()
+        first, second = self.sites[:2]
+        ids = f'{first.id},{second.id}'
+        self.assertEqual(client.get(f'/api/sites/itinerary/?ids={ids}').status_code, 200)
+        self.assertTrue(site_distances._loaded)
+
+        # Écritures sans signal dans ce processus, comme un save() d'un autre worker
+        TouristicSite.objects.filter(pk=second.pk).update(latitude=4.85)
+        response = client.get(f'/api/sites/itinerary/?ids={ids}')
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['legs'][0], _haversine(first.latitude, first.longitude, 4.85,
+                                                                      second.longitude), places=2)
+
+        TouristicSite.objects.filter(pk=second.pk).delete()
+        response = client.get(f'/api/sites/itinerary/?ids={ids}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_itinerary_site_deleted_before_serialization_is_404(self):
+        first, second = self.sites[:2]
+        ids = f'{first.id},{second.id}'
+        plan = plan_itinerary([first.id, second.id])
+        second.delete()
+        with mock.patch('requette.views.plan_itinerary', return_value=plan):
+            response = APIClient().get(f'/api/sites/itinerary/?ids={ids}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_two_opt_uncrosses_route(self):
+        # Points alignés : le parcours 0-2-1-3 se croise, 0-1-2-3 est optimal
+        positions = [0, 1, 2, 3]
+        matrix = [[abs(a - b) for b in positions] for a in positions]
+        self.assertEqual(two_opt([0, 2, 1, 3], matrix), [0, 1, 2, 3])
+        self.assertEqual(two_opt([0, 1, 2, 3], matrix), [0, 1, 2, 3])
+
+    def test_plan_itinerary_follows_nearest_sites(self):
+        first, second, third, fourth = self.sites
+        plan = plan_itinerary([first.id, fourth.id, second.id, third.id])
+        self.assertEqual(plan['order'], [first.id, second.id, third.id, fourth.id])
+        self.assertEqual(len(plan['legs']), 3)
+        self.assertAlmostEqual(plan['total_distance'], sum(plan['legs']), places=2)
+
+    def test_itinerary_finds_bulk_created_sites(self):
+        client = APIClient()
+        ids = ','.join(str(site.id) for site in self.sites[:2])
+        self.assertEqual(client.get(f'/api/sites/itinerary/?ids={ids}').status_code, 200)
+
+        # bulk_create n'envoie pas post_save : la matrice déjà chargée ne les connaît pas
+        created = TouristicSite.objects.bulk_create([
+            TouristicSite(name=f'Import {i}', description='', type='MUSEUM', latitude=3.7 + i * 0.01,
+                          longitude=11.4, image='', eco_score=2)
+            for i in range(3)
+        ])
+        ids = ','.join(str(site.id) for site in created)
+        response = client.get(f'/api/sites/itinerary/?ids={ids}')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(response.json()['order'], [site.id for site in created])
+
+        response = client.get(f'/api/sites/itinerary/?ids={created[0].id},999999')
+        self.assertEqual(response.status_code, 404)
+
+
+class FullTextSearchTests(TestCase):
+    """
+    Recherche plein texte sur la base de test, créée par toutes les migrations :
+    si une migration reconstruit une table et perd ses triggers FTS, ces tests échouent.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.lake = create_site('Lac Baleng', description='Promenade en barque', eco_score=2)
+        self.shore = create_site('Village de pêcheurs', description='Maisons au bord du lac', eco_score=5)
+        self.museum = create_site('Musée national', description='Collections historiques', type='MUSEUM', eco_score=4)
+
+    def search(self, query, **params):
+        params['search'] = query
+        response = self.client.get('/api/sites/', params)
+        self.assertEqual(response.status_code, 200)
+        return [site['id'] for site in response.json()]
+
+    def test_fts_triggers_survive_migrations(self):
+        fulltext_search = import_module('requette.migrations.0002_fulltext_search')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        for table in fulltext_search.FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                self.assertIn(f'{table}_fts_{suffix}', triggers)
+
+    def test_prefix_match_without_accents(self):
+        self.assertEqual(self.search('muse'), [self.museum.id])
+        self.assertEqual(self.search('pecheur'), [self.shore.id])
+        self.assertEqual(self.search('introuvable'), [])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('lac'), [self.lake.id, self.shore.id])
+
+    def test_ordering_overrides_relevance(self):
+        self.assertEqual(self.search('lac', ordering='-eco_score'), [self.shore.id, self.lake.id])
+
+    def test_result_cap_applies_only_to_relevance_ranking(self):
+        with mock.patch.object(search, 'SEARCH_MAX_RESULTS', 1):
+            self.assertEqual(self.search('lac'), [self.lake.id])
+            self.assertEqual(self.search('lac', ordering='-eco_score'), [self.shore.id, self.lake.id])
+            # Champ de tri non autorisé : ignoré par OrderingFilter, on reste sur la pertinence
+            self.assertEqual(self.search('lac', ordering='description'), [self.lake.id])
+            with mock.patch.object(search, '_has_fts_table', return_value=False), \
+                    mock.patch.dict(search._indexes, clear=True):
+                self.assertEqual(self.search('lac'), [self.lake.id])
+                self.assertEqual(self.search('lac', ordering='-eco_score'), [self.shore.id, self.lake.id])
+
+    def test_updates_and_deletes_are_indexed(self):
+        self.museum.name = 'Palais des congrès'
+        self.museum.save()
+        self.assertEqual(self.search('musee'), [])
+        self.assertEqual(self.search('palais'), [self.museum.id])
+        self.lake.delete()
+        self.assertEqual(self.search('lac'), [self.shore.id])
+
+    def test_bulk_created_rows_are_indexed(self):
+        service = Service.objects.bulk_create([Service(
+            name='Auberge du lac', type='HOTEL', description='Chambres', latitude=3.85, longitude=11.5,
+            site=self.lake,
+        )])[0]
+        response = self.client.get('/api/services/', {'search': 'auberge'})
+        self.assertEqual([item['id'] for item in response.json()], [service.id])
+
+    def test_inverted_index_fallback(self):
+        with mock.patch.object(search, '_has_fts_table', return_value=False), \
+                mock.patch.dict(search._indexes, clear=True):
+            self.assertEqual(self.search('muse'), [self.museum.id])
+            self.assertEqual(self.search('lac'), [self.lake.id, self.shore.id])
+            self.assertEqual(self.search('lac', ordering='-eco_score'), [self.shore.id, self.lake.id])
+            # L'index chargé suit ensuite les signaux post_save / post_delete
+            self.museum.name = 'Palais des congrès'
+            self.museum.save()
+            self.assertEqual(self.search('palais'), [self.museum.id])
+            self.lake.delete()
+            self.assertEqual(self.search('lac'), [self.shore.id])
+
+
+def png_bytes(size=(1600, 900), mode='RGB'):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new(mode, size, (30, 120, 60, 128) if mode == 'RGBA' else (30, 120, 60)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(TestCase):
+    """
+    Génération des miniatures et URLs exposées par l'API.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_render_derivatives_sizes_and_formats(self):
+        from PIL import Image
+
+        rendered = render_derivatives(png_bytes())
+        self.assertEqual(set(rendered), {(size, fmt) for size in DERIVATIVE_SIZES for fmt in DERIVATIVE_FORMATS})
+        for (size, fmt), content in rendered.items():
+            with Image.open(BytesIO(content)) as image:
+                self.assertEqual(image.format, DERIVATIVE_FORMATS[fmt][1]['format'])
+                width, height = image.size
+                self.assertLessEqual(width, DERIVATIVE_SIZES[size][0])
+                self.assertLessEqual(height, DERIVATIVE_SIZES[size][1])
+                self.assertAlmostEqual(width / height, 16 / 9, places=1)
+
+    def test_render_derivatives_keeps_alpha_in_webp(self):
+        from PIL import Image
+
+        rendered = render_derivatives(png_bytes((400, 400), 'RGBA'))
+        with Image.open(BytesIO(rendered['thumbnail', 'webp'])) as image:
+            self.assertEqual(image.mode, 'RGBA')
+        with Image.open(BytesIO(rendered['thumbnail', 'jpeg'])) as image:
+            self.assertEqual(image.mode, 'RGB')
+
+    def test_urls_are_exposed_once_generated(self):
+        name = default_storage.save('sites/chutes.png', ContentFile(png_bytes()))
+        site = create_site('Chutes', image=name)
+        self.assertIsNone(TouristicSiteSerializer(site).data['image_derivatives'])
+
+        output = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=output, stderr=StringIO())
+        self.assertIn('1 image(s) traitée(s), 0 échec(s)', output.getvalue())
+        for size in DERIVATIVE_SIZES:
+            for fmt in DERIVATIVE_FORMATS:
+                self.assertTrue(default_storage.exists(derivative_name(name, size, fmt)))
+
+        site.refresh_from_db()
+        urls = TouristicSiteSerializer(site).data['image_derivatives']
+        self.assertEqual(urls['thumbnail']['webp'], default_storage.url(derivative_name(name, 'thumbnail', 'webp')))
+
+        # Nouvelle image : plus d'URL tant que ses dérivés n'existent pas
+        site.image = default_storage.save('sites/lac.png', ContentFile(png_bytes()))
+        self.assertIsNone(TouristicSiteSerializer(site).data['image_derivatives'])
+
+    def test_images_sharing_a_stem_keep_their_own_derivatives(self):
+        from PIL import Image
+
+        jpeg = BytesIO()
+        Image.new('RGB', (1600, 900), (200, 30, 30)).save(jpeg, format='JPEG')
+        png_name = default_storage.save('sites/2.png', ContentFile(png_bytes()))
+        jpeg_name = default_storage.save('sites/2.jpg', ContentFile(jpeg.getvalue()))
+        self.assertNotEqual(derivative_name(png_name, 'thumbnail', 'webp'),
+                            derivative_name(jpeg_name, 'thumbnail', 'webp'))
+        create_site('Vert', image=png_name)
+        create_site('Rouge', image=jpeg_name)
+
+        output = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=output, stderr=StringIO())
+        self.assertIn('2 image(s) traitée(s), 0 échec(s)', output.getvalue())
+        colours = {}
+        for name in (png_name, jpeg_name):
+            with default_storage.open(derivative_name(name, 'thumbnail', 'jpeg'), 'rb') as f, Image.open(f) as image:
+                colours[name] = image.getpixel((10, 10))
+        self.assertGreater(colours[png_name][1], colours[png_name][0])
+        self.assertGreater(colours[jpeg_name][0], colours[jpeg_name][1])
+
+    def test_backfill_marks_existing_derivatives(self):
+        name = default_storage.save('sites/marche.png', ContentFile(png_bytes()))
+        site = create_site('Marché', image=name)
+        call_command('generate_image_derivatives', workers=1, stdout=StringIO(), stderr=StringIO())
+        TouristicSite.objects.filter(pk=site.pk).update(derivatives_image=None)
+
+        output = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=output, stderr=StringIO())
+        self.assertIn('0 image(s) à traiter', output.getvalue())
+        site.refresh_from_db()
+        self.assertIsNotNone(TouristicSiteSerializer(site).data['image_derivatives'])
+
+    def test_backfill_reports_missing_files(self):
+        create_site('Fantôme', image='sites/absent.png')
+        errors = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=StringIO(), stderr=errors)
+        self.assertIn('Fichier introuvable: sites/absent.png', errors.getvalue())
+
+
+class MetricsTests(TestCase):
+    """
+    Histogrammes par endpoint, middleware HTTP, chronométrage des renderers et export Prometheus.
+    """
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def series(self, name):
+        return registry._histograms[name]
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 7):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual((histogram.count, histogram.sum), (4, 11.5))
+
+    def test_prometheus_output(self):
+        metrics = MetricsRegistry()
+        metrics.record(Sample('http', 'Vue."a"'), 0.003)
+        lines = metrics.render().splitlines()
+        self.assertIn('# TYPE requette_request_duration_seconds histogram', lines)
+        labels = 'transport="http",endpoint="Vue.\\"a\\""'
+        self.assertIn(f'requette_request_duration_seconds_bucket{{{labels},le="0.0025"}} 0', lines)
+        self.assertIn(f'requette_request_duration_seconds_bucket{{{labels},le="0.005"}} 1', lines)
+        self.assertIn(f'requette_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', lines)
+        self.assertIn(f'requette_request_duration_seconds_count{{{labels}}} 1', lines)
+        self.assertIn(f'requette_db_queries_bucket{{{labels},le="0.0"}} 1', lines)
+
+    def test_middleware_records_queries_and_serialization(self):
+        create_site('Réserve de Dja')
+        response = APIClient().get('/api/sites/')
+        self.assertEqual(response.status_code, 200)
+
+        labels = ('http', 'TouristicSiteViewSet.list')
+        self.assertEqual(self.series('requette_request_duration_seconds')[labels].count, 1)
+        self.assertGreaterEqual(self.series('requette_db_queries')[labels].sum, 1)
+        self.assertGreater(self.series('requette_db_duration_seconds')[labels].sum, 0)
+        self.assertGreater(self.series('requette_serialization_duration_seconds')[labels].sum, 0)
+
+        body = APIClient().get('/metrics').content.decode()
+        self.assertIn('requette_request_duration_seconds_count{transport="http",'
+                      'endpoint="TouristicSiteViewSet.list"} 1', body)
+
+    def test_serialization_includes_serializer_data(self):
+        create_site('Réserve de Dja')
+        create_site('Parc de Waza')
+        for serializer in (TouristicSiteSerializer(TouristicSite.objects.all(), many=True),
+                           TouristicSiteSerializer(TouristicSite.objects.first())):
+            with self.subTest(many=hasattr(serializer, 'child')), collect(Sample('test', 'data')) as sample:
+                serializer.data
+            self.assertGreater(sample.serialization_time, 0)
+
+        # to_representation lent : compté même si l'encodage JSON est rapide
+        with mock.patch.object(TouristicSiteSerializer, 'get_image_derivatives',
+                               side_effect=lambda site: time.sleep(0.01)):
+            self.assertEqual(APIClient().get('/api/sites/').status_code, 200)
+        labels = ('http', 'TouristicSiteViewSet.list')
+        self.assertGreaterEqual(self.series('requette_serialization_duration_seconds')[labels].sum, 0.02)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    async def test_unknown_websocket_actions_share_one_series(self):
+        communicator = WebsocketCommunicator(TourismConsumer.as_asgi(), '/ws/tourism/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # message de bienvenue
+
+        for action in ('a', 'b', 'c', ['liste'], None):
+            await communicator.send_json_to({'action': action})
+        await communicator.send_json_to({'action': 'get_services'})
+        reply = await communicator.receive_json_from()
+        self.assertEqual(reply['type'], 'error')
+        await communicator.disconnect()
+
+        endpoints = sorted(endpoint for _, endpoint in self.series('requette_request_duration_seconds'))
+        self.assertEqual(endpoints, ['get_services', 'unknown'])
+        self.assertEqual(self.series('requette_request_duration_seconds')['ws', 'unknown'].count, 5)
+
+
+class PercentileTests(SimpleTestCase):
+    """
+    Percentile par rang le plus proche : la valeur de rang ceil(p/100 * n).
+    """
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(list(range(1, 21)), 95), 19)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 51), 3)
+
+    def test_bounds(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2, 3], 0), 1)
+
+
+class BenchmarkSmokeTests(TestCase):
+    """
+    Exécution complète des benchmarks sur un petit jeu de données : aucun cas ne doit échouer.
+    """
+
+    def setUp(self):
+        # Construction synchrone : un thread ne verrait pas les données de la transaction du test
+        patcher = mock.patch.object(SiteDistanceMatrix, 'warm', SiteDistanceMatrix.load)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        site_distances.invalidate()
+        call_command('seed_data', sites=12, services_per_site=2, profiles=3, actions_per_profile=2,
+                     stdout=StringIO())
+
+    def test_report_has_every_case_without_errors(self):
+        report = BenchmarkRunner(iterations=2, warmup=1, include_writes=True).run()
+        self.assertEqual(report['meta']['iterations'], 2)
+        self.assertEqual(report['meta']['dataset']['sites'], 12)
+        self.assertIn('GET /api/sites/itinerary/', report['results'])
+        for name in ('ws get_services', 'ws get_site_details', *WRITE_CASES):
+            self.assertIn(name, report['results'])
+        for name, result in report['results'].items():
+            self.assertEqual(result['count'], 2, name)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertIsNotNone(result['p95_ms'], name)
+        self.assertEqual(failed_cases(report), {})
+
+    def test_command_fails_on_errors(self):
+        output = os.path.join(settings.CATALOG_CACHE_DIR, 'benchmark.json')
+        self.addCleanup(lambda: os.path.exists(output) and os.unlink(output))
+        with mock.patch.object(TourismConsumer, 'get_site_details', side_effect=ValueError('panne')):
+            with self.assertRaisesMessage(CommandError, 'ws get_site_details (2/2)'):
+                call_command('run_benchmarks', iterations=2, warmup=0, output=output, stdout=StringIO())
+            errors = StringIO()
+            call_command('run_benchmarks', iterations=2, warmup=0, output=output, allow_errors=True,
+                         stdout=StringIO(), stderr=errors)
+        self.assertIn('ws get_site_details (2/2)', errors.getvalue())
+        with open(output) as f:
+            self.assertEqual(json.load(f)['results']['ws get_site_details']['errors'], 2)
+
+
+class CatalogSnapshotTests(TestCase):
+    """
+    Écriture du snapshot binaire puis requêtes de proximité sur le fichier mappé.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.snapshot')
+        self.site = create_site('Mont Cameroun', 4.2, 9.17)
+        self.far_site = create_site('Waza', 11.33, 14.67)
+        self.services = [
+            Service.objects.create(
+                name=f'Service {i}', type='HOTEL', description='', eco_friendly=i % 2 == 0,
+                latitude=4.2 + i * 0.01, longitude=9.17, site=self.site,
+            )
+            for i in range(6)
+        ]
+        Service.objects.create(name='Loin', type='OTHER', description='', latitude=11.33, longitude=14.67,
+                               site=self.far_site)
+
+    def test_tests_never_use_the_project_snapshot(self):
+        self.assertNotEqual(settings.CATALOG_SNAPSHOT_PATH, settings.BASE_DIR / 'catalog.snapshot')
+
+    def test_nearby_queries_match_haversine(self):
+        self.assertEqual(write_snapshot(self.path), (2, 7))
+        snapshot = CatalogSnapshot(self.path)
+        self.assertTrue(snapshot.open())
+
+        radius = 3.5
+        expected = sorted(
+            (_haversine(4.2, 9.17, service.latitude, service.longitude), service.id)
+            for service in Service.objects.all()
+            if _haversine(4.2, 9.17, service.latitude, service.longitude) <= radius
+        )
+        found = snapshot.nearby_services(4.2, 9.17, radius)
+        self.assertEqual([service_id for service_id, _ in found], [service_id for _, service_id in expected])
+        for (_, distance), (expected_distance, _) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=9)
+
+        eco_ids = set(Service.objects.filter(eco_friendly=True).values_list('id', flat=True))
+        eco = snapshot.nearby_services(4.2, 9.17, radius, eco_friendly=True)
+        self.assertEqual([service_id for service_id, _ in eco],
+                         [service_id for _, service_id in expected if service_id in eco_ids])
+        self.assertEqual([site_id for site_id, _ in snapshot.nearby_sites(11.3, 14.6, 20)], [self.far_site.id])
+
+    def test_rewritten_snapshot_is_reopened(self):
+        write_snapshot(self.path)
+        snapshot = CatalogSnapshot(self.path)
+        snapshot.open()
+        self.services[0].delete()
+        write_snapshot(self.path)
+        snapshot._checked_at = 0  # pas d'attente de CHECK_INTERVAL
+        ids = [service_id for service_id, _ in snapshot.nearby_services(4.2, 9.17, 1)]
+        self.assertNotIn(self.services[0].id, ids)
+
+    def test_missing_snapshot_falls_back(self):
+        self.assertFalse(CatalogSnapshot(self.path).open())
+        self.assertIsNone(CatalogSnapshot(self.path).nearby_services(4.2, 9.17, 5))
+
+    def test_endpoint_uses_snapshot(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            self.addCleanup(setattr, catalog_snapshot, '_checked_at', 0)
+            write_snapshot()
+            catalog_snapshot._checked_at = 0
+            with mock.patch.object(Service.objects, 'raw', side_effect=AssertionError('requête SQL utilisée')):
+                response = APIClient().get(f'/api/sites/{self.site.id}/nearby_services/', {'radius': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([service['id'] for service in response.json()],
+                         [service.id for service in self.services[:2]])
+
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    async def test_websocket_falls_back_to_sql_without_snapshot(self):
+        with override_settings(CATALOG_SNAPSHOT_PATH=self.path):
+            self.addCleanup(setattr, catalog_snapshot, '_checked_at', 0)
+            catalog_snapshot._checked_at = 0
+            self.assertFalse(catalog_snapshot.available)
+            communicator = WebsocketCommunicator(TourismConsumer.as_asgi(), '/ws/tourism/')
+            communicator.scope['user'] = AnonymousUser()
+            await communicator.connect()
+            await communicator.receive_json_from()  # message de bienvenue
+            await communicator.send_json_to({'action': 'get_services', 'latitude': 4.2, 'longitude': 9.17,
+                                             'radius': 2})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+        self.assertEqual(reply['type'], 'services_list')
+        self.assertEqual([service['id'] for service in reply['services']],
+                         [service.id for service in self.services[:2]])
+        self.assertEqual([service['distance'] for service in reply['services']],
+                         [round(_haversine(4.2, 9.17, service.latitude, 9.17), 2) for service in self.services[:2]])
+
+
+class AsyncViewParityTests(TestCase):
+    """
+    Les vues asynchrones doivent renvoyer exactement les mêmes octets que les ViewSets.
+    """
+
+    CASES = [
+        ('list', '/api/sites/', {}),
+        ('detail', '/api/sites/{site}/', {}),
+        ('nearby_services', '/api/sites/{site}/nearby_services/', {'radius': 5}),
+        ('eco_friendly', '/api/sites/eco_friendly/', {}),
+        ('by_type', '/api/services/by_type/', {}),
+        ('search_ordering', '/api/sites/', {'search': 'lac', 'ordering': '-eco_score'}),
+        ('detail_404', '/api/sites/999999/', {}),
+        ('nearby_services_404', '/api/sites/999999/nearby_services/', {}),
+        ('detail_invalid_id', '/api/sites/abc/', {}),
+    ]
+
+    def setUp(self):
+        self.site = create_site('Lac Ossa', 3.8, 10.0, description='Réserve du lac', eco_score=5,
+                                image='sites/ossa.png')
+        create_site('Lac Barombi', 4.66, 9.4, description='Lac de cratère', eco_score=2)
+        create_site('Musée de Douala', 4.05, 9.7, type='MUSEUM', eco_score=4)
+        for i, service_type in enumerate(['HOTEL', 'RESTAURANT', 'HOTEL']):
+            Service.objects.create(name=f'Service {i}', type=service_type, description='Au bord du lac',
+                                   eco_friendly=i % 2 == 0, latitude=3.8 + i * 0.01, longitude=10.0,
+                                   site=self.site)
+
+    def test_async_views_return_identical_bytes(self):
+        client = APIClient()
+        for name, path, params in self.CASES:
+            with self.subTest(name):
+                path = path.format(site=self.site.id)
+                expected = client.get(path, params)
+                response = client.get(path.replace('/api/', '/api/async/', 1), params)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response['Content-Type'], expected['Content-Type'])
+                self.assertEqual(response.content, expected.content)
+                if expected.status_code == 200:
+                    self.assertNotIn(expected.content, (b'[]', b'{}'))
+
+
+class EcoPointsWriteBehindTests(TestCase):
+    """
+    Journal des points écologiques : application par lots et lectures fusionnées.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('visiteur', password='secret', is_staff=True)
+        self.profile = UserProfile.objects.create(user=self.user, eco_points=50)
+        self.action = EcoAction.objects.create(name='Ramasser des déchets', description='', points=150)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Le flusher en arrière-plan ne voit pas les données de la transaction de test
+        patcher = mock.patch.object(eco_points, 'ensure_flusher')
+        self.ensure_flusher = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_profiles(self, count):
+        return [
+            UserProfile.objects.create(user=User.objects.create_user(f'profil{i}'))
+            for i in range(count)
+        ]
+
+    def test_flush_applies_batches_and_levels(self):
+        other = self.create_profiles(1)[0]
+        for points in (100, 200, 100):
+            eco_points.journal_points(self.profile, points)
+        eco_points.journal_points(other, 30)
+
+        self.assertEqual(eco_points.flush_pending_points(batch_size=3), 3)
+        self.assertEqual(EcoPointsJournal.objects.count(), 1)
+        self.assertEqual(eco_points.flush_all_pending_points(batch_size=3), 1)
+        self.assertFalse(EcoPointsJournal.objects.exists())
+
+        self.profile.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.profile.eco_points, self.profile.level), (450, 2))
+        # Le niveau ne redescend jamais sous le niveau initial
+        self.assertEqual((other.eco_points, other.level), (30, 1))
+
+    def test_flush_command(self):
+        eco_points.journal_points(self.profile, 10)
+        output = StringIO()
+        call_command('flush_eco_points', stdout=output)
+        self.assertIn('1 entrée(s)', output.getvalue())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.eco_points, 60)
+
+    def journal_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [query['sql'] for query in captured if 'ecopointsjournal' in query['sql']]
+
+    def test_profile_list_reads_journal_once(self):
+        self.create_profiles(5)
+        eco_points.journal_points(self.profile, 25)
+        # Sans write-behind, le journal n'est jamais lu
+        self.assertEqual(self.journal_queries('/api/profiles/'), [])
+        with override_settings(ECO_POINTS_WRITE_BEHIND=True):
+            self.assertEqual(len(self.journal_queries('/api/profiles/')), 1)
+            points = {item['id']: item['eco_points'] for item in self.client.get('/api/profiles/').json()}
+        self.assertEqual(points[self.profile.id], 75)
+        self.assertEqual(sorted(set(points.values())), [0, 75])
+
+    @override_settings(ECO_POINTS_WRITE_BEHIND=True)
+    def test_rest_complete_action_is_journaled_and_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/profiles/{self.profile.id}/complete_action/',
+                                        {'action_id': self.action.id})
+        self.assertEqual(response.json(), {'status': 'success', 'points_earned': 150, 'total_points': 200})
+        self.ensure_flusher.assert_called()
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.eco_points, 50)
+        self.assertEqual(UserAction.objects.filter(user_profile=self.profile).count(), 1)
+
+        detail = self.client.get(f'/api/profiles/{self.profile.id}/').json()
+        self.assertEqual((detail['eco_points'], detail['level']), (200, 1))
+        statistics = self.client.get(f'/api/profiles/{self.profile.id}/statistics/').json()
+        self.assertEqual((statistics['total_points'], statistics['level']), (200, 1))
+
+        again = self.client.post(f'/api/profiles/{self.profile.id}/complete_action/', {'action_id': self.action.id})
+        self.assertEqual(again.status_code, 400)
+        self.assertEqual(EcoPointsJournal.objects.count(), 1)
+
+    def test_rest_complete_action_without_write_behind(self):
+        response = self.client.post(f'/api/profiles/{self.profile.id}/complete_action/',
+                                    {'action_id': self.action.id})
+        self.assertEqual(response.json()['total_points'], 200)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.eco_points, 200)
+        self.assertFalse(EcoPointsJournal.objects.exists())
+
+    async def complete_over_websocket(self):
+        communicator = WebsocketCommunicator(TourismConsumer.as_asgi(), '/ws/tourism/')
+        communicator.scope['user'] = self.user
+        await communicator.connect()
+        await communicator.receive_json_from()  # message de bienvenue
+        await communicator.send_json_to({'action': 'complete_action', 'action_id': self.action.id})
+        reply = await communicator.receive_json_from()
+        await communicator.disconnect()
+        return reply
+
+    @override_settings(ECO_POINTS_WRITE_BEHIND=True,
+                       CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    async def test_websocket_complete_action_is_journaled(self):
+        self.action.points = 400
+        await self.action.asave()
+        reply = await self.complete_over_websocket()
+        self.assertEqual(reply['type'], 'action_result')
+        self.assertEqual(
+            {key: reply['data'][key] for key in ('status', 'points', 'level', 'level_up', 'points_earned')},
+            {'status': 'success', 'points': 450, 'level': 2, 'level_up': True, 'points_earned': 400},
+        )
+        self.assertEqual(await EcoPointsJournal.objects.acount(), 1)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    async def test_websocket_complete_action_updates_profile(self):
+        self.action.points = 400
+        await self.action.asave()
+        reply = await self.complete_over_websocket()
+        self.assertEqual((reply['data']['points'], reply['data']['level'], reply['data']['level_up']),
+                         (450, 2, True))
+        profile = await UserProfile.objects.aget(pk=self.profile.pk)
+        self.assertEqual((profile.eco_points, profile.level), (450, 2))
+        self.assertFalse(await EcoPointsJournal.objects.aexists())
+
+    def test_flusher_never_starts_outside_a_server(self):
+        from django.apps import apps
+
+        with override_settings(ECO_POINTS_WRITE_BEHIND=True):
+            apps.get_app_config('requette').ready()
+            call_command('flush_eco_points', stdout=StringIO())
+        self.ensure_flusher.assert_not_called()
+
+    def test_flusher_starts_with_the_server_only_when_enabled(self):
+        self.client.get('/api/eco-actions/')
+        self.ensure_flusher.assert_not_called()
+        with override_settings(ECO_POINTS_WRITE_BEHIND=True):
+            self.client.get('/api/eco-actions/')
+            self.ensure_flusher.assert_called_once()
+            for module in ('RangerAi.asgi', 'RangerAi.wsgi'):
+                self.ensure_flusher.reset_mock()
+                sys.modules.pop(module, None)
+                import_module(module)
+                self.ensure_flusher.assert_called_once()
+
+
+class CatalogVersionTests(TestCase):
+    """
+    Les caches en mémoire se rechargent quand un autre processus signale une écriture en masse.
+    """
+
+    def setUp(self):
+        self.first = create_site('Départ', 3.85, 11.5)
+        self.second = create_site('Arrivée', 3.86, 11.5)
+
+    def test_token_is_checked_at_most_once_per_interval(self):
+        reader = ModelVersion(Service)
+        before = reader.current()
+        ModelVersion(Service).bump()  # autre processus
+        self.assertEqual(reader.current(), before)
+        reader._checked_at = 0
+        self.assertNotEqual(reader.current(), before)
+
+    def test_distance_matrix_reloads_after_bump(self):
+        matrix = SiteDistanceMatrix()
+        matrix.load()
+        # Écriture sans signal, comme depuis un autre processus ; seul le site demandé est relu
+        TouristicSite.objects.filter(pk=self.second.pk).update(latitude=4.85)
+        requested = site_coordinates([self.first.id])
+        with mock.patch.object(SiteDistanceMatrix, 'warm', SiteDistanceMatrix.load):
+            matrix.submatrix(requested)
+            self.assertEqual(matrix._lat[matrix._index[self.second.id]], math.radians(3.86))
+
+            model_version(TouristicSite).bump()
+            matrix.submatrix(requested)
+        self.assertEqual(matrix._lat[matrix._index[self.second.id]], math.radians(4.85))
+
+    def test_inverted_index_reloads_after_bump(self):
+        index = search.InvertedIndex(TouristicSite, ('name',))
+        self.assertEqual(index.search(['depart']), [self.first.id])
+        TouristicSite.objects.filter(pk=self.first.pk).update(name='Embarcadère')
+        self.assertEqual(index.search(['embarcadere']), [])
+        model_version(TouristicSite).bump()
+        self.assertEqual(index.search(['embarcadere']), [self.first.id])
+
+
+class ImportCatalogTests(TestCase):
+    """
+    Lecture en flux des fichiers et import par lots avec upsert sur external_id.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def feature(self, feature_id, longitude, latitude, **properties):
+        return {'type': 'Feature', 'id': feature_id,
+                'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                'properties': properties}
+
+    def geojson(self, name, features):
+        return self.write(name, json.dumps(
+            {'type': 'FeatureCollection', 'name': 'test', 'features': features}, indent=2
+        ))
+
+    def sites_csv(self, rows, header='external_id,name,description,type,latitude,longitude,eco_score'):
+        return self.write('sites.csv', '\n'.join([header] + rows) + '\n')
+
+    def run_import(self, **options):
+        output, errors = StringIO(), StringIO()
+        call_command('import_catalog', stdout=output, stderr=errors, skip_derivatives=True, **options)
+        return output.getvalue(), errors.getvalue()
+
+    def test_geojson_is_read_across_buffer_refills(self):
+        long_description = 'forêt ' * 2000  # bien plus grand que le tampon de lecture
+        path = self.geojson('services.geojson', [
+            self.feature('a', 9.7, 4.05, name='Court'),
+            self.feature('b', 9.8, 4.06, name='Long', description=long_description),
+            self.feature(3, 9.9, 4.07, name='Numérique', external_id='c'),
+        ])
+        with mock.patch.object(import_catalog, 'READ_SIZE', 16):
+            rows = list(import_catalog.read_geojson(path))
+        self.assertEqual([number for number, _ in rows], [1, 2, 3])
+        self.assertEqual(rows[0][1], {'name': 'Court', 'external_id': 'a', 'longitude': 9.7, 'latitude': 4.05})
+        self.assertEqual(rows[1][1]['description'], long_description)
+        self.assertEqual(rows[2][1]['external_id'], 'c')
+
+    def test_invalid_geojson_is_rejected(self):
+        complete = json.dumps({'type': 'FeatureCollection', 'features': [self.feature('a', 1, 2)] * 3})
+        truncated = self.write('tronque.geojson', complete[:len(complete) // 2])
+        with mock.patch.object(import_catalog, 'READ_SIZE', 16), self.assertRaisesMessage(CommandError, 'tronqué'):
+            list(import_catalog.read_geojson(truncated))
+        without_features = self.write('vide.geojson', json.dumps({'type': 'Feature'}))
+        with self.assertRaisesMessage(CommandError, "'features' introuvable"):
+            list(import_catalog.read_geojson(without_features))
+        with self.assertRaisesMessage(CommandError, 'format non reconnu'):
+            self.run_import(sites=self.write('sites.txt', ''))
+
+    def test_import_validates_and_upserts(self):
+        sites = self.sites_csv([
+            's1,Chutes de la Lobé,Cascade,NATURE,2.88,9.9,5',
+            's2,Musée de Douala,Collections,MUSEUM,4.05,9.7,3',
+            's3,Château,Inconnu,CASTLE,abc,9.7,9',
+            ',Sans identifiant,,NATURE,4,9,3',
+        ])
+        services = self.geojson('services.geojson', [
+            self.feature(f'v{i}', 9.9, 2.88 + i * 0.001, name=f'Hôtel {i}', type='HOTEL', description='Chambres',
+                         eco_friendly=i % 2 == 0, site_external_id='s1')
+            for i in range(5)
+        ] + [self.feature('orphelin', 1, 1, name='Perdu', type='HOTEL', description='Chambres', site_external_id='s9')])
+
+        output, errors = self.run_import(sites=sites, services=services, chunk_size=2, batch_size=2)
+        self.assertIn('2 site(s) et 5 service(s) importé(s), 3 ligne(s) rejetée(s)', output, errors)
+        self.assertIn("sites.csv:4: type: Value 'CASTLE' is not a valid choice.", errors)
+        self.assertIn('sites.csv:5: external_id: Ce champ est obligatoire.', errors)
+        self.assertIn('services.geojson:6: site_external_id: Site introuvable: s9', errors)
+        lobe = TouristicSite.objects.get(external_id='s1')
+        self.assertEqual(lobe.services.count(), 5)
+        self.assertEqual(Service.objects.filter(eco_friendly=True).count(), 3)
+
+        # Réimport : mise à jour par external_id, sans doublon ni perte des champs absents du fichier
+        TouristicSite.objects.filter(pk=lobe.pk).update(image='sites/lobe.png')
+        sites = self.sites_csv(['s1,Chutes de la Lobé,Cascade sur la mer,NATURE,2.88,9.9,4'])
+        services = self.write('services.csv', 'external_id,site_external_id,name,type,description,eco_friendly,'
+                                              'latitude,longitude\nv0,s2,Hôtel déplacé,HOTEL,Chambres,non,4.05,9.7\n')
+        self.run_import(sites=sites, services=services)
+        self.assertEqual(TouristicSite.objects.count(), 2)
+        self.assertEqual(Service.objects.count(), 5)
+        lobe.refresh_from_db()
+        self.assertEqual((lobe.description, lobe.eco_score, lobe.image.name), ('Cascade sur la mer', 4, 'sites/lobe.png'))
+        moved = Service.objects.get(external_id='v0')
+        self.assertEqual((moved.name, moved.site.external_id, moved.eco_friendly), ('Hôtel déplacé', 's2', False))
+
+    def test_empty_cells_keep_existing_values_in_mixed_chunks(self):
+        kept = create_site('Gardé', image='sites/garde.png', external_id='s1')
+        create_site('Changé', image='sites/ancien.png', external_id='s2')
+        for external_id in ('v1', 'v2'):
+            Service.objects.create(name=external_id, type='HOTEL', description='Chambres', eco_friendly=True,
+                                   latitude=3.85, longitude=11.5, site=kept, external_id=external_id)
+
+        # Même paquet : une ligne avec image, une avec la cellule vide
+        sites = self.sites_csv([
+            's1,Gardé,Site de test,NATURE,3.85,11.5,3,',
+            's2,Changé,Site de test,NATURE,3.85,11.5,3,sites/nouveau.png',
+        ], header='external_id,name,description,type,latitude,longitude,eco_score,image')
+        services = self.write('services.csv', 'external_id,site_external_id,name,type,description,eco_friendly,'
+                                              'latitude,longitude\n'
+                                              'v1,s1,Hôtel,HOTEL,Chambres,,3.85,11.5\n'
+                                              'v2,s1,Auberge,HOTEL,Chambres,non,3.85,11.5\n')
+        self.run_import(sites=sites, services=services)
+        images = dict(TouristicSite.objects.values_list('external_id', 'image'))
+        self.assertEqual(images, {'s1': 'sites/garde.png', 's2': 'sites/nouveau.png'})
+        services = {service.external_id: service for service in Service.objects.all()}
+        self.assertEqual((services['v1'].name, services['v1'].eco_friendly), ('Hôtel', True))
+        self.assertEqual((services['v2'].name, services['v2'].eco_friendly), ('Auberge', False))
+
+    def test_import_refreshes_caches_of_other_processes(self):
+        existing = create_site('Existant', 3.85, 11.5, external_id='s1')
+        other = create_site('Autre', 3.86, 11.5)
+        # Matrice chargée par un worker du serveur avant l'import
+        worker_matrix = SiteDistanceMatrix()
+        worker_matrix.load()
+        self.run_import(sites=self.sites_csv(['s1,Existant,Déplacé,NATURE,4.85,11.5,3']))
+        with mock.patch.object(SiteDistanceMatrix, 'warm', SiteDistanceMatrix.load):
+            distance = worker_matrix.submatrix(site_coordinates([existing.id, other.id]))[0][1]
+        self.assertEqual(worker_matrix._version, model_version(TouristicSite).current())
+        self.assertAlmostEqual(distance, _haversine(4.85, 11.5, 3.86, 11.5), places=6)
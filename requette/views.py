@@ -4,11 +4,18 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from django.db import transaction
 from django.db.models import Q, Count
 from django.utils import timezone
 from datetime import timedelta
 from .models import TouristicSite, Service, EcoAction, UserProfile, UserAction
 from .serializer import *
+from .itinerary import plan_itinerary
+from .search import FullTextSearchFilter
+from .snapshot import catalog_snapshot
+from .eco_points import write_behind_enabled, with_pending_points, journal_points, effective_points
+
+ITINERARY_MAX_STOPS = 50
 
 class TouristicSiteViewSet(viewsets.ModelViewSet):
     """
@@ -18,7 +25,7 @@ class TouristicSiteViewSet(viewsets.ModelViewSet):
     queryset = TouristicSite.objects.all()
     serializer_class = TouristicSiteSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description', 'type']
     ordering_fields = ['name', 'eco_score', 'created_at']
 
@@ -32,7 +39,14 @@ class TouristicSiteViewSet(viewsets.ModelViewSet):
         """
         site = self.get_object()
         radius = float(request.query_params.get('radius', 5.0))
-        
+
+        nearby = catalog_snapshot.nearby_services(site.latitude, site.longitude, radius)
+        if nearby is not None:
+            # Snapshot mappé en mémoire : seuls les services trouvés sont lus en base
+            found = Service.objects.in_bulk([service_id for service_id, _ in nearby])
+            services = [found[service_id] for service_id, _ in nearby if service_id in found]
+            return Response(ServiceSerializer(services, many=True).data)
+
         # Utilise la formule de Haversine pour calculer la distance
         services = Service.objects.raw('''
             SELECT *, 
@@ -57,6 +71,48 @@ class TouristicSiteViewSet(viewsets.ModelViewSet):
         serializer = self.serializer_class(eco_sites, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def itinerary(self, request):
+        """
+        Retourne un ordre de visite pour plusieurs sites (plus proche voisin + 2-opt).
+
+        Parameters:
+            ids (str): IDs des sites séparés par des virgules, le premier étant le départ
+        """
+        try:
+            site_ids = [int(site_id) for site_id in request.query_params.get('ids', '').split(',') if site_id]
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'IDs de sites invalides'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not 2 <= len(site_ids) <= ITINERARY_MAX_STOPS:
+            return Response({
+                'status': 'error',
+                'message': f'Entre 2 et {ITINERARY_MAX_STOPS} sites requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            plan = plan_itinerary(site_ids)
+        except KeyError:
+            return Response({
+                'status': 'error',
+                'message': 'Site non trouvé'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        sites = TouristicSite.objects.in_bulk(plan['order'])
+        if len(sites) != len(plan['order']):
+            # Site supprimé entre le calcul et la lecture
+            return Response({
+                'status': 'error',
+                'message': 'Site non trouvé'
+            }, status=status.HTTP_404_NOT_FOUND)
+        plan['sites'] = self.serializer_class(
+            [sites[site_id] for site_id in plan['order']], many=True
+        ).data
+        return Response(plan)
+
 class ServiceViewSet(viewsets.ModelViewSet):
     """
     ViewSet pour gérer les services (hôtels, restaurants, etc.).
@@ -64,7 +120,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description', 'type']
     ordering_fields = ['name', 'type']
 
@@ -121,9 +177,11 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         Filtre les profils pour que l'utilisateur ne voie que le sien,
         sauf pour les administrateurs qui peuvent voir tous les profils.
         """
+        # Points en attente dans le journal (mode write-behind), fusionnés à la lecture
+        queryset = with_pending_points(self.queryset)
         if self.request.user.is_staff:
-            return self.queryset
-        return self.queryset.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     @action(detail=True, methods=['post'])
     def complete_action(self, request, pk=None):
@@ -145,18 +203,29 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 action=action,
                 completed_at__date=timezone.now().date()
             ).exists():
-                # Crée l'action et met à jour les points
-                UserAction.objects.create(
-                    user_profile=profile,
-                    action=action
-                )
-                profile.eco_points += action.points
-                profile.save()
+                if write_behind_enabled():
+                    # Journalise les points : le profil sera mis à jour par lots
+                    with transaction.atomic():
+                        UserAction.objects.create(
+                            user_profile=profile,
+                            action=action
+                        )
+                        journal_points(profile, action.points)
+                    total_points, _ = effective_points(profile)
+                else:
+                    # Crée l'action et met à jour les points
+                    UserAction.objects.create(
+                        user_profile=profile,
+                        action=action
+                    )
+                    profile.eco_points += action.points
+                    profile.save()
+                    total_points = profile.eco_points
                 
                 return Response({
                     'status': 'success',
                     'points_earned': action.points,
-                    'total_points': profile.eco_points
+                    'total_points': total_points
                 })
             else:
                 return Response({
@@ -187,10 +256,11 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         """
         profile = self.get_object()
         week_ago = timezone.now() - timedelta(days=7)
+        total_points, level = effective_points(profile)
         
         stats = {
-            'total_points': profile.eco_points,
-            'level': profile.level,
+            'total_points': total_points,
+            'level': level,
             'total_actions': UserAction.objects.filter(user_profile=profile).count(),
             'actions_this_week': UserAction.objects.filter(
                 user_profile=profile,